@@ -8,12 +8,45 @@ This script sets up the required AWS infrastructure including:
 - Bedrock access configuration
 """
 
-import boto3
+import argparse
+import functools
 import json
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import jmespath
 from botocore.exceptions import ClientError
 
+from file_utils import write_json
+
+# Shared client configuration: pooled keep-alive connections and adaptive (client-side rate limited) retries
+BOTO_CONFIG_OPTIONS = {
+    "max_pool_connections": 50,
+    "tcp_keepalive": True,
+    "retries": {"mode": "adaptive", "max_attempts": 10},
+    "connect_timeout": 5,
+    "read_timeout": 30
+}
+
+BEDROCK_MODEL_ID = "anthropic.claude-3-5-sonnet-20241022-v2:0"
+
+# Projections applied to each GetAccountAuthorizationDetails page
+ROLE_POLICIES_EXPRESSION = jmespath.compile("RoleDetailList[].[RoleName, AttachedManagedPolicies[].PolicyArn]")
+POLICY_ARNS_EXPRESSION = jmespath.compile("Policies[].[PolicyName, Arn]")
+
+BEDROCK_VALIDATION_ATTEMPTS = 5
+THROTTLING_ERROR_CODES = ('ThrottlingException', 'TooManyRequestsException')
+
+# Minimal inference request used by --full-validate
+BEDROCK_TEST_BODY = json.dumps({
+    "anthropic_version": "bedrock-2023-05-31",
+    "max_tokens": 10,
+    "messages": [{"role": "user", "content": "Hello"}]
+}, separators=(',', ':')).encode()
 
+
+@functools.lru_cache(maxsize=1)
 def load_config():
     """Load deployment configuration"""
     try:
@@ -24,7 +57,34 @@ def load_config():
         sys.exit(1)
 
 
-def create_oidc_provider(iam_client, repo_owner, repo_name):
+def load_cached_oidc_provider_arn(aws_account_id):
+    """Return the OIDC provider ARN saved by a previous run for this account, if any"""
+    try:
+        with open("deployment/aws_config.json", "r") as f:
+            oidc_provider_arn = json.load(f).get('oidc_provider_arn')
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    
+    if oidc_provider_arn and f":iam::{aws_account_id}:" in oidc_provider_arn:
+        return oidc_provider_arn
+    return None
+
+
+def get_iam_snapshot(iam_client):
+    """Fetch existing roles (with their attached policies) and customer managed policies in one paginated sweep"""
+    paginator = iam_client.get_paginator('get_account_authorization_details')
+    snapshot = {"roles": {}, "policies": {}}
+    
+    # Project each page as it arrives so the full account details are never held in memory
+    for page in paginator.paginate(Filter=['Role', 'LocalManagedPolicy']):
+        for role_name, policy_arns in ROLE_POLICIES_EXPRESSION.search(page) or []:
+            snapshot["roles"][role_name] = set(policy_arns or [])
+        snapshot["policies"].update(POLICY_ARNS_EXPRESSION.search(page) or [])
+    
+    return snapshot
+
+
+def create_oidc_provider(iam_client, oidc_provider_arns):
     """Create GitHub OIDC identity provider"""
     print("🔐 Setting up GitHub OIDC Identity Provider...")
     
@@ -33,15 +93,10 @@ def create_oidc_provider(iam_client, repo_owner, repo_name):
     
     try:
         # Check if provider already exists
-        try:
-            response = iam_client.get_open_id_connect_provider(
-                OpenIDConnectProviderArn=f"arn:aws:iam::{config['aws_account_id']}:oidc-provider/token.actions.githubusercontent.com"
-            )
-            print("✅ OIDC Provider already exists")
-            return response['Arn']
-        except ClientError as e:
-            if e.response['Error']['Code'] != 'NoSuchEntity':
-                raise
+        for provider_arn in oidc_provider_arns:
+            if provider_arn.endswith(":oidc-provider/token.actions.githubusercontent.com"):
+                print("✅ OIDC Provider already exists")
+                return provider_arn
         
         # Create new OIDC provider
         response = iam_client.create_open_id_connect_provider(
@@ -58,13 +113,9 @@ def create_oidc_provider(iam_client, repo_owner, repo_name):
         sys.exit(1)
 
 
-def create_iam_role(iam_client, config, oidc_provider_arn):
-    """Create IAM role for GitHub Actions"""
-    print("👤 Creating IAM Role...")
-    
-    role_name = f"GitHubActions-ContactFlowComparison-{config['environment']}"
-    
-    # Trust policy for GitHub Actions
+@functools.lru_cache(maxsize=32)
+def trust_policy_document(repo_owner, repo_name, oidc_provider_arn):
+    """Return the serialized GitHub Actions trust policy for a repository"""
     trust_policy = {
         "Version": "2012-10-17",
         "Statement": [
@@ -79,21 +130,26 @@ def create_iam_role(iam_client, config, oidc_provider_arn):
                         "token.actions.githubusercontent.com:aud": "sts.amazonaws.com"
                     },
                     "StringLike": {
-                        "token.actions.githubusercontent.com:sub": f"repo:{config['repo_owner']}/{config['repo_name']}:*"
+                        "token.actions.githubusercontent.com:sub": f"repo:{repo_owner}/{repo_name}:*"
                     }
                 }
             }
         ]
     }
     
-    # Permissions policy
+    return json.dumps(trust_policy, separators=(',', ':'))
+
+
+@functools.lru_cache(maxsize=32)
+def permissions_policy_document(aws_region, aws_account_id):
+    """Return the serialized permissions policy for the comparison role"""
     permissions_policy = {
         "Version": "2012-10-17",
         "Statement": [
             {
                 "Effect": "Allow",
                 "Action": ["bedrock-runtime:InvokeModel"],
-                "Resource": f"arn:aws:bedrock:{config['aws_region']}:{config['aws_account_id']}:inference-profile/us.anthropic.claude-3-5-sonnet-20241022-v2:0"
+                "Resource": f"arn:aws:bedrock:{aws_region}:{aws_account_id}:inference-profile/us.{BEDROCK_MODEL_ID}"
             },
             {
                 "Effect": "Allow",
@@ -103,45 +159,50 @@ def create_iam_role(iam_client, config, oidc_provider_arn):
         ]
     }
     
+    return json.dumps(permissions_policy, separators=(',', ':'))
+
+
+def create_iam_role(iam_client, config, oidc_provider_arn, iam_snapshot):
+    """Create IAM role for GitHub Actions"""
+    print("👤 Creating IAM Role...")
+    
+    role_name = f"GitHubActions-ContactFlowComparison-{config['environment']}"
+    
     try:
         # Create role
-        try:
-            role_response = iam_client.create_role(
+        if role_name in iam_snapshot['roles']:
+            print(f"✅ IAM Role already exists: {role_name}")
+        else:
+            iam_client.create_role(
                 RoleName=role_name,
-                AssumeRolePolicyDocument=json.dumps(trust_policy),
+                AssumeRolePolicyDocument=trust_policy_document(config['repo_owner'], config['repo_name'], oidc_provider_arn),
                 Description="Role for GitHub Actions Contact Flow Comparison"
             )
             print(f"✅ IAM Role created: {role_name}")
-        except ClientError as e:
-            if e.response['Error']['Code'] == 'EntityAlreadyExists':
-                print(f"✅ IAM Role already exists: {role_name}")
-                role_response = iam_client.get_role(RoleName=role_name)
-            else:
-                raise
         
         # Create and attach policy
         policy_name = f"ContactFlowComparisonPolicy-{config['environment']}"
-        try:
+        if policy_name in iam_snapshot['policies']:
+            policy_arn = iam_snapshot['policies'][policy_name]
+            print(f"✅ Policy already exists: {policy_name}")
+        else:
             policy_response = iam_client.create_policy(
                 PolicyName=policy_name,
-                PolicyDocument=json.dumps(permissions_policy),
+                PolicyDocument=permissions_policy_document(config['aws_region'], config['aws_account_id']),
                 Description="Policy for Contact Flow Comparison GitHub Action"
             )
             policy_arn = policy_response['Policy']['Arn']
             print(f"✅ Policy created: {policy_name}")
-        except ClientError as e:
-            if e.response['Error']['Code'] == 'EntityAlreadyExists':
-                policy_arn = f"arn:aws:iam::{config['aws_account_id']}:policy/{policy_name}"
-                print(f"✅ Policy already exists: {policy_name}")
-            else:
-                raise
         
         # Attach policy to role
-        iam_client.attach_role_policy(
-            RoleName=role_name,
-            PolicyArn=policy_arn
-        )
-        print("✅ Policy attached to role")
+        if policy_arn in iam_snapshot['roles'].get(role_name, set()):
+            print("✅ Policy already attached to role")
+        else:
+            iam_client.attach_role_policy(
+                RoleName=role_name,
+                PolicyArn=policy_arn
+            )
+            print("✅ Policy attached to role")
         
         role_arn = f"arn:aws:iam::{config['aws_account_id']}:role/{role_name}"
         return role_arn
@@ -151,24 +212,37 @@ def create_iam_role(iam_client, config, oidc_provider_arn):
         sys.exit(1)
 
 
-def validate_bedrock_access(bedrock_client, config):
-    """Validate Bedrock model access"""
+def validate_bedrock_access(bedrock_client, config, bedrock_runtime_client=None):
+    """Validate Bedrock model access
+    
+    Uses the ListFoundationModels control-plane call by default. When a runtime
+    client is passed, also runs a real (billed) inference against the profile.
+    """
     print("🧠 Validating Bedrock access...")
     
     try:
-        # Test inference profile access
-        model_id = f"arn:aws:bedrock:{config['aws_region']}:{config['aws_account_id']}:inference-profile/us.anthropic.claude-3-5-sonnet-20241022-v2:0"
+        # Confirm the Claude model backing the inference profile is visible
+        models = bedrock_client.list_foundation_models(byProvider='Anthropic')['modelSummaries']
+        if not any(model['modelId'] == BEDROCK_MODEL_ID for model in models):
+            print(f"⚠️  Bedrock validation warning: {BEDROCK_MODEL_ID} is not available in {config['aws_region']}")
+            return False
         
-        test_request = {
-            "anthropic_version": "bedrock-2023-05-31",
-            "max_tokens": 10,
-            "messages": [{"role": "user", "content": "Hello"}]
-        }
-        
-        response = bedrock_client.invoke_model(
-            modelId=model_id,
-            body=json.dumps(test_request)
-        )
+        if bedrock_runtime_client is not None:
+            # Test inference profile access
+            model_id = f"arn:aws:bedrock:{config['aws_region']}:{config['aws_account_id']}:inference-profile/us.{BEDROCK_MODEL_ID}"
+            
+            # Back off on throttling so a burst doesn't turn into a failed validation
+            for attempt in range(BEDROCK_VALIDATION_ATTEMPTS):
+                try:
+                    bedrock_runtime_client.invoke_model(
+                        modelId=model_id,
+                        body=BEDROCK_TEST_BODY
+                    )
+                    break
+                except ClientError as e:
+                    if e.response['Error']['Code'] not in THROTTLING_ERROR_CODES or attempt == BEDROCK_VALIDATION_ATTEMPTS - 1:
+                        raise
+                    time.sleep(2 ** attempt)
         
         print("✅ Bedrock access validated successfully")
         return True
@@ -181,19 +255,44 @@ def validate_bedrock_access(bedrock_client, config):
 
 def main():
     """Main AWS setup function"""
+    parser = argparse.ArgumentParser(description="Set up AWS infrastructure for the Contact Flow Comparison Tool")
+    parser.add_argument("--full-validate", action="store_true", help="Validate Bedrock with a real (billed) model invocation")
+    args = parser.parse_args()
+    
     print("☁️  AWS Infrastructure Setup")
     print("=" * 40)
     
     config = load_config()
     
+    # Deferred so --help and configuration errors don't pay the SDK import cost
+    import boto3
+    from botocore.config import Config
+    
     try:
-        # Initialize AWS clients
-        iam_client = boto3.client('iam', region_name=config['aws_region'])
-        bedrock_client = boto3.client('bedrock-runtime', region_name=config['aws_region'])
+        # Initialize AWS clients from a single session so credentials are resolved once
+        boto_config = Config(**BOTO_CONFIG_OPTIONS)
+        session = boto3.Session(region_name=config['aws_region'])
+        iam_client = session.client('iam', config=boto_config)
+        bedrock_client = session.client('bedrock', config=boto_config)
+        bedrock_runtime_client = session.client('bedrock-runtime', config=boto_config) if args.full_validate else None
+        sts_client = session.client('sts', config=boto_config)
+        
+        # The OIDC provider only changes through explicit deletion, so reuse the ARN from a previous run
+        cached_oidc_provider_arn = load_cached_oidc_provider_arn(config['aws_account_id'])
+        
+        # Verify AWS credentials and snapshot existing IAM state concurrently
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            identity_future = executor.submit(sts_client.get_caller_identity)
+            snapshot_future = executor.submit(get_iam_snapshot, iam_client)
+            if cached_oidc_provider_arn:
+                oidc_provider_arns = [cached_oidc_provider_arn]
+            else:
+                oidc_future = executor.submit(iam_client.list_open_id_connect_providers)
+                oidc_provider_arns = [p['Arn'] for p in oidc_future.result()['OpenIDConnectProviderList']]
+            
+            identity = identity_future.result()
+            iam_snapshot = snapshot_future.result()
         
-        # Verify AWS credentials
-        sts_client = boto3.client('sts')
-        identity = sts_client.get_caller_identity()
         print(f"🔍 AWS Account: {identity['Account']}")
         
         if identity['Account'] != config['aws_account_id']:
@@ -201,9 +300,9 @@ def main():
             sys.exit(1)
         
         # Set up infrastructure
-        oidc_provider_arn = create_oidc_provider(iam_client, config['repo_owner'], config['repo_name'])
-        role_arn = create_iam_role(iam_client, config, oidc_provider_arn)
-        validate_bedrock_access(bedrock_client, config)
+        oidc_provider_arn = create_oidc_provider(iam_client, oidc_provider_arns)
+        role_arn = create_iam_role(iam_client, config, oidc_provider_arn, iam_snapshot)
+        validate_bedrock_access(bedrock_client, config, bedrock_runtime_client)
         
         # Save results
         aws_config = {
@@ -212,8 +311,7 @@ def main():
             "role_name": role_arn.split('/')[-1]
         }
         
-        with open("deployment/aws_config.json", "w") as f:
-            json.dump(aws_config, f, indent=2)
+        write_json("deployment/aws_config.json", aws_config)
         
         print(f"\n✅ AWS setup completed successfully!")
         print(f"📝 Configuration saved to deployment/aws_config.json")
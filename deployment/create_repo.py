@@ -6,10 +6,19 @@ This script helps you create a new GitHub repository for the Contact Flow Compar
 and sets up the initial structure.
 """
 
-import json
 import os
 import sys
-from ghapi.all import GhApi
+from pathlib import Path
+
+from file_utils import write_json
+
+try:
+    import pygit2
+except ImportError:
+    pygit2 = None
+
+
+INITIAL_COMMIT_MESSAGE = "Initial setup for Contact Flow Comparison"
 
 
 def get_github_token():
@@ -72,7 +81,7 @@ def setup_initial_structure(repo_owner, repo_name):
     ]
     
     for directory in directories:
-        os.makedirs(directory, exist_ok=True)
+        Path(directory).mkdir(parents=True, exist_ok=True)
         print(f"✅ Created directory: {directory}")
     
     # Create initial README
@@ -105,8 +114,7 @@ After pushing contact flow changes, check the GitHub Actions artifacts for:
 - Summary index of all changes
 """
     
-    with open("README.md", "w") as f:
-        f.write(readme_content)
+    Path("README.md").write_text(readme_content)
     print("✅ Created README.md")
     
     # Create sample contact flow
@@ -133,8 +141,7 @@ After pushing contact flow changes, check the GitHub Actions artifacts for:
     }
     
     sample_path = "imports/resources/flows/welcome-flow.json"
-    with open(sample_path, "w") as f:
-        json.dump(sample_flow, f, indent=2)
+    write_json(sample_path, sample_flow)
     print(f"✅ Created sample contact flow: {sample_path}")
     
     # Create .gitignore additions
@@ -153,35 +160,88 @@ venv/
     print("✅ Updated .gitignore")
 
 
-def initialize_git_repo(repo_url):
+def initialize_git_repo_in_process(repo_url, github_token):
+    """Initialize, commit and push the local repository with libgit2 in a single process"""
+    try:
+        # Initialize git if not already done, directly on the main branch
+        if os.path.exists(".git"):
+            repo = pygit2.Repository(".")
+        else:
+            repo = pygit2.init_repository(".", initial_head="main")
+            print("✅ Git repository initialized")
+        
+        # Add or update remote origin
+        if "origin" in repo.remotes.names():
+            repo.remotes.set_url("origin", repo_url)
+            print("✅ Remote origin updated")
+        else:
+            repo.remotes.create("origin", repo_url)
+            print("✅ Remote origin added")
+        
+        # Add and commit initial files
+        repo.index.add_all()
+        repo.index.write()
+        tree = repo.index.write_tree()
+        signature = repo.default_signature
+        parents = [] if repo.head_is_unborn else [repo.head.target]
+        repo.create_commit("HEAD", signature, signature, INITIAL_COMMIT_MESSAGE, tree, parents)
+        print("✅ Initial commit created")
+        
+        # A pre-existing repository may be on another branch; rename it to main like `git branch -M main`
+        branch = repo.branches.local[repo.head.shorthand]
+        if branch.branch_name != "main":
+            branch = branch.rename("main", True)
+        
+        # Push to GitHub and track origin/main
+        callbacks = pygit2.RemoteCallbacks(credentials=pygit2.UserPass("x-access-token", github_token))
+        repo.remotes["origin"].push(["refs/heads/main:refs/heads/main"], callbacks=callbacks)
+        branch.upstream = repo.branches.remote["origin/main"]
+        print("✅ Pushed to GitHub")
+        
+    except (pygit2.GitError, KeyError) as e:
+        print(f"⚠️  Git operation failed: {e}")
+        print("You may need to push manually later")
+
+
+def initialize_git_repo(repo_url, github_token=None):
     """Initialize local git repository"""
     print("🔧 Initializing local git repository...")
     
+    # Prefer in-process libgit2 when available to avoid spawning a git process per step
+    if pygit2 is not None and github_token:
+        initialize_git_repo_in_process(repo_url, github_token)
+        return
+    
     import subprocess
     
+    def git(*args):
+        subprocess.run(["git", *args], check=True)
+    
     try:
-        # Initialize git if not already done
-        if not os.path.exists(".git"):
-            subprocess.run(["git", "init"], check=True)
+        # Initialize git if not already done, directly on the main branch
+        existing_repo = os.path.exists(".git")
+        if not existing_repo:
+            git("init", "-b", "main")
             print("✅ Git repository initialized")
         
         # Add remote origin
         try:
-            subprocess.run(["git", "remote", "add", "origin", repo_url], check=True)
+            git("remote", "add", "origin", repo_url)
             print("✅ Remote origin added")
         except subprocess.CalledProcessError:
             # Remote might already exist
-            subprocess.run(["git", "remote", "set-url", "origin", repo_url], check=True)
+            git("remote", "set-url", "origin", repo_url)
             print("✅ Remote origin updated")
         
         # Add and commit initial files
-        subprocess.run(["git", "add", "."], check=True)
-        subprocess.run(["git", "commit", "-m", "Initial setup for Contact Flow Comparison"], check=True)
+        git("add", "-A")
+        git("commit", "-m", INITIAL_COMMIT_MESSAGE)
         print("✅ Initial commit created")
         
-        # Push to GitHub
-        subprocess.run(["git", "branch", "-M", "main"], check=True)
-        subprocess.run(["git", "push", "-u", "origin", "main"], check=True)
+        # Push to GitHub; a pre-existing repository may be on another branch, so rename it to main first
+        if existing_repo:
+            git("branch", "-M", "main")
+        git("push", "-u", "origin", "main")
         print("✅ Pushed to GitHub")
         
     except subprocess.CalledProcessError as e:
@@ -197,7 +257,9 @@ def main():
     # Get GitHub token
     github_token = get_github_token()
     
-    # Initialize GitHub API
+    # Initialize GitHub API; ghapi is imported here as it loads the whole GitHub API spec
+    from ghapi.all import GhApi
+    
     try:
         api = GhApi(token=github_token)
         user = api.user.get()
@@ -227,7 +289,7 @@ def main():
     setup_initial_structure(user.login, repo_name)
     
     # Initialize git repository
-    initialize_git_repo(repo.clone_url)
+    initialize_git_repo(repo.clone_url, github_token)
     
     # Save configuration for next steps
     repo_config = {
@@ -239,8 +301,7 @@ def main():
     }
     
     os.makedirs("deployment", exist_ok=True)
-    with open("deployment/repo_config.json", "w") as f:
-        json.dump(repo_config, f, indent=2)
+    write_json("deployment/repo_config.json", repo_config)
     
     print(f"\n✅ Repository setup completed successfully!")
     print(f"📝 Configuration saved to deployment/repo_config.json")
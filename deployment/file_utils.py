@@ -0,0 +1,25 @@
+"""
+File helpers shared by the deployment scripts
+"""
+
+import json
+import os
+from pathlib import Path
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def write_json(path, data):
+    """Write data as indented JSON in a single write, replacing the file atomically"""
+    if orjson is not None:
+        content = orjson.dumps(data, option=orjson.OPT_INDENT_2)
+    else:
+        content = json.dumps(data, indent=2).encode()
+    
+    # Write a sibling temp file first so a crash never leaves a truncated file behind
+    tmp_path = Path(f"{path}.tmp")
+    tmp_path.write_bytes(content)
+    os.replace(tmp_path, path)
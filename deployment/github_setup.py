@@ -8,39 +8,32 @@ This script sets up the GitHub repository with:
 - Repository variables setup
 """
 
+import base64
+import functools
+import hashlib
 import json
 import os
 import sys
-from ghapi.all import GhApi
+from concurrent.futures import ThreadPoolExecutor
+from string import Template
 
+from file_utils import write_json
 
-def load_configs():
-    """Load deployment and AWS configurations"""
-    try:
-        with open("deployment/config.json", "r") as f:
-            config = json.load(f)
-        with open("deployment/aws_config.json", "r") as f:
-            aws_config = json.load(f)
-        return config, aws_config
-    except FileNotFoundError as e:
-        print(f"❌ Configuration file not found: {e}")
-        print("Run setup.py and aws_setup.py first.")
-        sys.exit(1)
+try:
+    from nacl import encoding, public
+except ImportError:
+    public = None
 
 
-def create_workflow_file(config, aws_config):
-    """Create GitHub Actions workflow file"""
-    print("📝 Creating GitHub Actions workflow...")
-    
-    workflow_content = f"""name: Contact Flows Comparison Action
+WORKFLOW_TEMPLATE = Template("""name: Contact Flows Comparison Action
 
 on:
   push:
     paths:
-      - "{config['contact_flow_path']}/**"
+      - "$contact_flow_path/**"
 
 concurrency:
-  group: ${{{{ github.workflow }}}}-${{{{ github.ref }}}}
+  group: $${{ github.workflow }}-$${{ github.ref }}
   cancel-in-progress: true
 
 permissions:
@@ -51,7 +44,7 @@ jobs:
   compare_flows:
     name: compare
     runs-on: ubuntu-latest
-    environment: {config['environment']}
+    environment: $environment
     steps:
       - uses: actions/checkout@v4
         with:
@@ -61,26 +54,65 @@ jobs:
       - name: Configure AWS Credentials
         uses: aws-actions/configure-aws-credentials@v4
         with:
-          role-to-assume: {aws_config['role_arn']}
-          aws-region: {config['aws_region']}
+          role-to-assume: $role_arn
+          aws-region: $aws_region
 
       - name: Run Compare Action
         uses: aws-samples/connect-contact-flow-comparison-github-action@main
         env:
-          ENVIRONMENT: {config['environment']}
+          ENVIRONMENT: $environment
         with:
-          github_pat: ${{{{ secrets.FLOW_COMPARE_PAT }}}}
-          repo_owner: {config['repo_owner']}
-          repo: {config['repo_name']}
-          commit_sha: ${{{{ github.sha }}}}
-          contact_flow_path: ${{{{ vars.CONTACT_FLOW_PATH }}}}
-"""
+          github_pat: $${{ secrets.FLOW_COMPARE_PAT }}
+          repo_owner: $repo_owner
+          repo: $repo_name
+          commit_sha: $${{ github.sha }}
+          contact_flow_path: $${{ vars.CONTACT_FLOW_PATH }}
+""")
+
+
+@functools.lru_cache(maxsize=1)
+def load_configs():
+    """Load deployment and AWS configurations"""
+    try:
+        with open("deployment/config.json", "r") as f:
+            config = json.load(f)
+        with open("deployment/aws_config.json", "r") as f:
+            aws_config = json.load(f)
+        return config, aws_config
+    except FileNotFoundError as e:
+        print(f"❌ Configuration file not found: {e}")
+        print("Run setup.py and aws_setup.py first.")
+        sys.exit(1)
+
+
+def file_sha256(path):
+    """Return the SHA-256 hex digest of a file's contents"""
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def create_workflow_file(config, aws_config):
+    """Create GitHub Actions workflow file"""
+    print("📝 Creating GitHub Actions workflow...")
+    
+    workflow_content = WORKFLOW_TEMPLATE.substitute(
+        contact_flow_path=config['contact_flow_path'],
+        environment=config['environment'],
+        role_arn=aws_config['role_arn'],
+        aws_region=config['aws_region'],
+        repo_owner=config['repo_owner'],
+        repo_name=config['repo_name']
+    )
     
     # Create .github/workflows directory
     os.makedirs(".github/workflows", exist_ok=True)
     
-    # Write workflow file
+    # Write workflow file, leaving it untouched when the content is unchanged
     workflow_path = ".github/workflows/compare-flows.yml"
+    if os.path.exists(workflow_path) and file_sha256(workflow_path) == hashlib.sha256(workflow_content.encode()).hexdigest():
+        print(f"✅ Workflow file up to date: {workflow_path}")
+        return workflow_path
+    
     with open(workflow_path, "w") as f:
         f.write(workflow_content)
     
@@ -88,14 +120,70 @@ jobs:
     return workflow_path
 
 
-def setup_github_secrets_and_variables(config, aws_config):
-    """Set up GitHub repository secrets and variables"""
+def list_repo_variable_names(api, config):
+    """Return the names of all existing repository variables"""
+    names = set()
+    page = 1
+    while True:
+        # The variables endpoint returns at most 30 entries per page
+        response = api.actions.list_repo_variables(
+            owner=config['repo_owner'],
+            repo=config['repo_name'],
+            per_page=30,
+            page=page
+        )
+        names.update(variable.name for variable in response.variables)
+        if not response.variables or len(names) >= response.total_count:
+            return names
+        page += 1
+
+
+def upsert_repo_variable(api, config, existing_variables, var_name, var_value):
+    """Create or update a single repository variable"""
+    try:
+        if var_name in existing_variables:
+            api.actions.update_repo_variable(
+                owner=config['repo_owner'],
+                repo=config['repo_name'],
+                name=var_name,
+                value=var_value
+            )
+            print(f"✅ Updated variable: {var_name}")
+        else:
+            api.actions.create_repo_variable(
+                owner=config['repo_owner'],
+                repo=config['repo_name'],
+                name=var_name,
+                value=var_value
+            )
+            print(f"✅ Created variable: {var_name}")
+            
+    except Exception as e:
+        print(f"⚠️  Could not set variable {var_name}: {e}")
+
+
+def set_repo_secret(api, config, public_key, secret_name, secret_value):
+    """Encrypt a secret with the repository public key and upload it"""
+    sealed_box = public.SealedBox(public.PublicKey(public_key.key.encode(), encoding.Base64Encoder()))
+    encrypted_value = base64.b64encode(sealed_box.encrypt(secret_value.encode())).decode()
+    
+    api.actions.create_or_update_repo_secret(
+        owner=config['repo_owner'],
+        repo=config['repo_name'],
+        secret_name=secret_name,
+        encrypted_value=encrypted_value,
+        key_id=public_key.key_id
+    )
+
+
+def setup_github_secrets_and_variables(api, config, aws_config):
+    """Set up GitHub repository secrets and variables
+    
+    Returns a (success, secrets_set) tuple; secrets are only uploaded when PyNaCl is installed.
+    """
     print("🔐 Setting up GitHub secrets and variables...")
     
     try:
-        # Initialize GitHub API
-        api = GhApi(token=config['github_token'])
-        
         # Test repository access
         repo_info = api.repos.get(owner=config['repo_owner'], repo=config['repo_name'])
         print(f"✅ Repository access confirmed: {repo_info.full_name}")
@@ -105,21 +193,29 @@ def setup_github_secrets_and_variables(config, aws_config):
             "FLOW_COMPARE_PAT": config['github_token']
         }
         
-        for secret_name, secret_value in secrets_to_set.items():
+        secrets_set = False
+        if public is None:
+            print("⚠️  PyNaCl is not installed; secrets cannot be encrypted")
+        else:
             try:
-                # Get repository public key for encryption
+                # Get repository public key for encryption (invariant per repository)
                 public_key = api.actions.get_repo_public_key(
                     owner=config['repo_owner'],
                     repo=config['repo_name']
                 )
                 
-                # Note: In a real implementation, you'd encrypt the secret value
-                # For now, we'll just indicate what needs to be set
-                print(f"🔑 Secret '{secret_name}' needs to be set manually in GitHub")
-                print(f"   Go to: https://github.com/{config['repo_owner']}/{config['repo_name']}/settings/secrets/actions")
+                for secret_name, secret_value in secrets_to_set.items():
+                    set_repo_secret(api, config, public_key, secret_name, secret_value)
+                    print(f"✅ Set secret: {secret_name}")
+                secrets_set = True
                 
             except Exception as e:
-                print(f"⚠️  Could not set secret {secret_name}: {e}")
+                print(f"⚠️  Could not set secrets: {e}")
+        
+        if not secrets_set:
+            for secret_name in secrets_to_set:
+                print(f"🔑 Secret '{secret_name}' needs to be set manually in GitHub")
+            print(f"   Go to: https://github.com/{config['repo_owner']}/{config['repo_name']}/settings/secrets/actions")
         
         # Set up variables
         variables_to_set = {
@@ -127,41 +223,17 @@ def setup_github_secrets_and_variables(config, aws_config):
             "ACCOUNT": config['aws_account_id']
         }
         
-        for var_name, var_value in variables_to_set.items():
-            try:
-                # Check if variable exists
-                try:
-                    api.actions.get_repo_variable(
-                        owner=config['repo_owner'],
-                        repo=config['repo_name'],
-                        name=var_name
-                    )
-                    # Update existing variable
-                    api.actions.update_repo_variable(
-                        owner=config['repo_owner'],
-                        repo=config['repo_name'],
-                        name=var_name,
-                        value=var_value
-                    )
-                    print(f"✅ Updated variable: {var_name}")
-                except:
-                    # Create new variable
-                    api.actions.create_repo_variable(
-                        owner=config['repo_owner'],
-                        repo=config['repo_name'],
-                        name=var_name,
-                        value=var_value
-                    )
-                    print(f"✅ Created variable: {var_name}")
-                    
-            except Exception as e:
-                print(f"⚠️  Could not set variable {var_name}: {e}")
+        existing_variables = list_repo_variable_names(api, config)
         
-        return True
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            for var_name, var_value in variables_to_set.items():
+                executor.submit(upsert_repo_variable, api, config, existing_variables, var_name, var_value)
+        
+        return True, secrets_set
         
     except Exception as e:
         print(f"❌ GitHub setup failed: {e}")
-        return False
+        return False, False
 
 
 def create_sample_contact_flow():
@@ -199,8 +271,7 @@ def create_sample_contact_flow():
     
     # Write sample flow
     sample_path = os.path.join(flow_dir, "sample-flow.json")
-    with open(sample_path, "w") as f:
-        json.dump(sample_flow, f, indent=2)
+    write_json(sample_path, sample_flow)
     
     print(f"✅ Sample contact flow created: {sample_path}")
     return sample_path
@@ -217,8 +288,11 @@ def main():
         # Create workflow file
         workflow_path = create_workflow_file(config, aws_config)
         
-        # Setup secrets and variables
-        github_success = setup_github_secrets_and_variables(config, aws_config)
+        # Setup secrets and variables with a single GitHub API client for the whole run;
+        # ghapi is imported here as it loads the whole GitHub API spec
+        from ghapi.all import GhApi
+        api = GhApi(token=config['github_token'])
+        github_success, secrets_set = setup_github_secrets_and_variables(api, config, aws_config)
         
         # Create sample contact flow
         sample_path = create_sample_contact_flow()
@@ -230,17 +304,23 @@ def main():
             "setup_complete": github_success
         }
         
-        with open("deployment/github_config.json", "w") as f:
-            json.dump(github_config, f, indent=2)
+        write_json("deployment/github_config.json", github_config)
         
         print(f"\n✅ GitHub setup completed!")
         print(f"📝 Configuration saved to deployment/github_config.json")
         
+        manual_steps = []
+        if not secrets_set:
+            manual_steps.append(
+                "Set the FLOW_COMPARE_PAT secret in GitHub:\n"
+                f"   https://github.com/{config['repo_owner']}/{config['repo_name']}/settings/secrets/actions"
+            )
+        manual_steps.append(f"Commit and push the workflow file: {workflow_path}")
+        manual_steps.append(f"Test by modifying a contact flow in: {config['contact_flow_path']}")
+        
         print(f"\n📋 Manual steps required:")
-        print(f"1. Set the FLOW_COMPARE_PAT secret in GitHub:")
-        print(f"   https://github.com/{config['repo_owner']}/{config['repo_name']}/settings/secrets/actions")
-        print(f"2. Commit and push the workflow file: {workflow_path}")
-        print(f"3. Test by modifying a contact flow in: {config['contact_flow_path']}")
+        for step_number, step in enumerate(manual_steps, 1):
+            print(f"{step_number}. {step}")
         
         print(f"\nNext step: Test the deployment with:")
         print(f"python deployment/test_deployment.py")
@@ -11,7 +11,9 @@ import json
 import os
 import sys
 from dataclasses import dataclass
-from typing import Dict, List, Optional
+from typing import Iterator, List, Optional, Tuple
+
+from file_utils import write_json
 
 
 @dataclass
@@ -35,6 +37,12 @@ class ValidationResult:
     recommendations: List[str]
 
 
+def load_config_file(path: str) -> DeploymentConfig:
+    """Load a deployment configuration from a JSON file"""
+    with open(path, 'r') as f:
+        return DeploymentConfig(**json.load(f))
+
+
 def collect_configuration() -> DeploymentConfig:
     """Collect configuration from user input"""
     print("🚀 Contact Flow Comparison Tool Setup")
@@ -67,36 +75,39 @@ def collect_configuration() -> DeploymentConfig:
     )
 
 
-def validate_configuration(config: DeploymentConfig) -> ValidationResult:
-    """Validate the provided configuration"""
-    errors = []
-    warnings = []
-    recommendations = []
-    
+def iter_validation_issues(config: DeploymentConfig) -> Iterator[Tuple[str, str]]:
+    """Yield (severity, message) pairs for each problem found in the configuration"""
     # Validate required fields
     if not config.github_token:
-        errors.append("GitHub token is required")
+        yield "error", "GitHub token is required"
     if not config.repo_owner:
-        errors.append("Repository owner is required")
+        yield "error", "Repository owner is required"
     if not config.repo_name:
-        errors.append("Repository name is required")
+        yield "error", "Repository name is required"
     if not config.aws_account_id:
-        errors.append("AWS Account ID is required")
+        yield "error", "AWS Account ID is required"
     
     # Validate AWS Account ID format
     if config.aws_account_id and not config.aws_account_id.isdigit():
-        errors.append("AWS Account ID must be numeric")
+        yield "error", "AWS Account ID must be numeric"
     
     # Validate AWS region
     if config.aws_region != "us-east-1":
-        warnings.append("Bedrock inference profiles are optimized for us-east-1")
-        recommendations.append("Consider using us-east-1 for better performance")
+        yield "warning", "Bedrock inference profiles are optimized for us-east-1"
+        yield "recommendation", "Consider using us-east-1 for better performance"
+
+
+def validate_configuration(config: DeploymentConfig) -> ValidationResult:
+    """Validate the provided configuration"""
+    issues = {"error": [], "warning": [], "recommendation": []}
+    for severity, message in iter_validation_issues(config):
+        issues[severity].append(message)
     
     return ValidationResult(
-        success=len(errors) == 0,
-        errors=errors,
-        warnings=warnings,
-        recommendations=recommendations
+        success=not issues["error"],
+        errors=issues["error"],
+        warnings=issues["warning"],
+        recommendations=issues["recommendation"]
     )
 
 
@@ -110,9 +121,7 @@ def main():
     
     try:
         if args.config_file and os.path.exists(args.config_file):
-            with open(args.config_file, 'r') as f:
-                config_data = json.load(f)
-                config = DeploymentConfig(**config_data)
+            config = load_config_file(args.config_file)
         else:
             config = collect_configuration()
         
@@ -143,8 +152,7 @@ def main():
         
         # Save configuration for next steps
         os.makedirs("deployment", exist_ok=True)
-        with open("deployment/config.json", "w") as f:
-            json.dump(config.__dict__, f, indent=2)
+        write_json("deployment/config.json", config.__dict__)
         
         print(f"\n📝 Configuration saved to deployment/config.json")
         print(f"\nNext steps:")
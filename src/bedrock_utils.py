@@ -1,57 +1,103 @@
+import array
+import functools
 import json
 import logging
-import random
-import time
+import threading
 from dataclasses import dataclass
+from string import Template
 
-import boto3
-from botocore.config import Config
-from botocore.exceptions import ClientError
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
-class TokenRateLimiter:
-    """Rate limiter for Bedrock API token usage.
-    
-    Implements a sliding window rate limiting algorithm to ensure
-    API token usage stays within specified limits.
-    
-    Args:
-        tokens_per_minute (int): Maximum tokens allowed per minute
-        
-    Example:
-        >>> limiter = TokenRateLimiter(400000)
-        >>> limiter.wait_for_tokens(1000)
-    """
-    def __init__(self, tokens_per_minute=400000):
-        self.tokens_per_minute = tokens_per_minute
-        self.tokens_per_second = tokens_per_minute / 60
-        self.last_request_time = 0
-        self.used_tokens = 0
-        self.window_start_time = time.time()
+def configure_logging(level=logging.INFO):
+    """Install the root log handler; called by entry points rather than at import"""
+    logging.basicConfig(
+        level=level,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
 
-    def wait_for_tokens(self, tokens_needed):
-        current_time = time.time()
-        
-        # Reset window if a minute has passed
-        if current_time - self.window_start_time >= 60:
-            self.used_tokens = 0
-            self.window_start_time = current_time
+def dumps_json(obj, pretty=False):
+    """Serialize obj to compact (or 2-space indented) JSON bytes, using orjson when installed"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if pretty else None)
+    return json.dumps(obj, indent=2 if pretty else None, separators=None if pretty else (',', ':')).encode()
+
+def loads_json(data):
+    """Deserialize JSON from str or bytes, using orjson when installed"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
 
-        # Check if we would exceed the rate limit
-        if self.used_tokens + tokens_needed > self.tokens_per_minute:
-            sleep_time = 60 - (current_time - self.window_start_time)
-            time.sleep(max(0, sleep_time))
-            self.used_tokens = 0
-            self.window_start_time = time.time()
+# Viewport of the latency chart drawn into the metrics report
+CHART_WIDTH = 800
+CHART_HEIGHT = 200
+
+# Bedrock response headers carrying per-call latency and token counts
+METRIC_HEADERS = (
+    'x-amzn-bedrock-invocation-latency',
+    'x-amzn-bedrock-input-token-count',
+    'x-amzn-bedrock-output-token-count'
+)
 
-        self.used_tokens += tokens_needed
+# Static shell of the metrics report; only the summary values and chart data are substituted per call
+METRICS_REPORT_TEMPLATE = Template("""
+<!DOCTYPE html>
+<html>
+<head>
+    <title>Bedrock API Metrics Report</title>
+    <style>
+        body { font-family: Arial, sans-serif; margin: 20px; }
+        .metrics-container { display: grid; grid-template-columns: repeat(2, 1fr); gap: 20px; }
+        .metric-card { 
+            background: #f5f5f5; 
+            padding: 15px; 
+            border-radius: 8px;
+            box-shadow: 0 2px 4px rgba(0,0,0,0.1);
+        }
+        .chart-container { margin-top: 20px; }
+    </style>
+</head>
+<body>
+    <h1>Bedrock API Metrics Summary</h1>
+    
+    <div class="metrics-container">
+        <div class="metric-card">
+            <h3>General Statistics</h3>
+            <p>Total API Calls: $total_api_calls</p>
+            <p>Success Rate: $success_rate%</p>
+            <p>Total Retry Attempts: $total_retry_attempts</p>
+        </div>
+        
+        <div class="metric-card">
+            <h3>Latency</h3>
+            <p>Average Latency: ${average_latency_ms}ms</p>
+        </div>
+        
+        <div class="metric-card">
+            <h3>Token Usage</h3>
+            <p>Total Input Tokens: $total_input_tokens</p>
+            <p>Total Output Tokens: $total_output_tokens</p>
+            <p>Average Input Tokens: $average_input_tokens</p>
+            <p>Average Output Tokens: $average_output_tokens</p>
+        </div>
+    </div>
+    
+    <div class="chart-container">
+        <h3>API Call Latencies</h3>
+        <svg viewBox="0 0 $chart_width $chart_height" width="100%" height="$chart_height" preserveAspectRatio="none" role="img" aria-label="API call latencies">
+            <polyline fill="none" stroke="rgb(75, 192, 192)" stroke-width="2" vector-effect="non-scaling-stroke" points="$latency_points"/>
+        </svg>
+        <p>Peak Latency: ${peak_latency_ms}ms</p>
+    </div>
+</body>
+</html>
+""")
 
-@dataclass
+@dataclass(slots=True)
 class BedrockMetric:
     request_id: str
     http_status: int
@@ -73,33 +119,80 @@ class BedrockMetricsCollector:
         save_metrics: Save metrics to JSON
         generate_html_report: Create HTML visualization
     """
+    __slots__ = (
+        '_request_ids', '_status', '_latency', '_input', '_output', '_retries', '_timestamps',
+        '_total_latency', '_total_input', '_total_output', '_total_retries', '_success_count', '_lock'
+    )
+
     def __init__(self):
-        self.metrics = []
+        # Columnar storage: numeric fields are packed into typed arrays
+        self._request_ids = []
+        self._status = array.array('H')
+        self._latency = array.array('i')
+        self._input = array.array('i')
+        self._output = array.array('i')
+        self._retries = array.array('i')
+        self._timestamps = []
+        
+        # Running totals so summaries don't rescan the columns
+        self._total_latency = 0
+        self._total_input = 0
+        self._total_output = 0
+        self._total_retries = 0
+        self._success_count = 0
+        self._lock = threading.Lock()
+        
+    @property
+    def metrics(self):
+        """Collected metrics as one dict per API call"""
+        return [
+            {
+                'request_id': request_id,
+                'http_status': status,
+                'latency_ms': latency,
+                'input_tokens': input_tokens,
+                'output_tokens': output_tokens,
+                'retry_attempts': retries,
+                'timestamp': timestamp
+            }
+            for request_id, status, latency, input_tokens, output_tokens, retries, timestamp in zip(
+                self._request_ids, self._status, self._latency, self._input, self._output, self._retries, self._timestamps, strict=True
+            )
+        ]
         
     def add_metric(self, response_metadata):
         """Add a single API call metadata to metrics collection"""
-        headers = response_metadata['HTTPHeaders']
-        metric = {
-            'request_id': response_metadata['RequestId'],
-            'http_status': response_metadata['HTTPStatusCode'],
-            'latency_ms': int(headers.get('x-amzn-bedrock-invocation-latency', 0)),
-            'input_tokens': int(headers.get('x-amzn-bedrock-input-token-count', 0)),
-            'output_tokens': int(headers.get('x-amzn-bedrock-output-token-count', 0)),
-            'retry_attempts': response_metadata['RetryAttempts'],
-            'timestamp': headers.get('date')
-        }
-        self.metrics.append(metric)
+        # botocore already lowercases HTTPHeaders into a plain dict, so these are direct probes
+        latency, input_tokens, output_tokens, timestamp = map(response_metadata['HTTPHeaders'].get, METRIC_HEADERS + ('date',))
+        latency, input_tokens, output_tokens = int(latency or 0), int(input_tokens or 0), int(output_tokens or 0)
+        status = response_metadata['HTTPStatusCode']
+        retries = response_metadata['RetryAttempts']
+        
+        with self._lock:
+            self._request_ids.append(response_metadata['RequestId'])
+            self._status.append(status)
+            self._latency.append(latency)
+            self._input.append(input_tokens)
+            self._output.append(output_tokens)
+            self._retries.append(retries)
+            self._timestamps.append(timestamp)
+        
+            self._total_latency += latency
+            self._total_input += input_tokens
+            self._total_output += output_tokens
+            self._total_retries += retries
+            self._success_count += status == 200
         
     def get_summary(self):
         """Generate summary statistics from collected metrics"""
-        if not self.metrics:
+        if not self._request_ids:
             return "No metrics collected"
             
-        total_calls = len(self.metrics)
-        total_latency = sum(m['latency_ms'] for m in self.metrics)
-        total_input_tokens = sum(m['input_tokens'] for m in self.metrics)
-        total_output_tokens = sum(m['output_tokens'] for m in self.metrics)
-        total_retries = sum(m['retry_attempts'] for m in self.metrics)
+        total_calls = len(self._request_ids)
+        total_latency = self._total_latency
+        total_input_tokens = self._total_input
+        total_output_tokens = self._total_output
+        total_retries = self._total_retries
         
         summary = {
             'total_api_calls': total_calls,
@@ -109,110 +202,83 @@ class BedrockMetricsCollector:
             'average_input_tokens': total_input_tokens / total_calls,
             'average_output_tokens': total_output_tokens / total_calls,
             'total_retry_attempts': total_retries,
-            'success_rate': sum(1 for m in self.metrics if m['http_status'] == 200) / total_calls * 100
+            'success_rate': self._success_count / total_calls * 100
         }
         
         return summary
     
-    def save_metrics(self, filename='bedrock_metrics.json'):
-        """Save detailed metrics to a JSON file"""
-        with open(filename, 'w') as f:
-            json.dump({
+    def save_metrics(self, filename='bedrock_metrics.json', pretty=False):
+        """Save detailed metrics to a JSON file, compact unless pretty is set"""
+        with open(filename, 'wb', buffering=1 << 20) as f:
+            f.write(dumps_json({
                 'detailed_metrics': self.metrics,
                 'summary': self.get_summary()
-            }, f, indent=2)
+            }, pretty=pretty))
+            
+    def _latency_points(self):
+        """Scale latencies into SVG polyline points spanning the chart viewport"""
+        peak = max(self._latency, default=0) or 1
+        step = CHART_WIDTH / max(len(self._latency) - 1, 1)
+        return ' '.join(
+            f"{i * step:.1f},{CHART_HEIGHT - latency * CHART_HEIGHT / peak:.1f}"
+            for i, latency in enumerate(self._latency)
+        )
             
     def generate_html_report(self, filename='bedrock_metrics.html'):
         """Generate an HTML report with metrics visualization"""
-        summary = self.get_summary()
-        html_content = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <title>Bedrock API Metrics Report</title>
-            <script src="https://cdn.jsdelivr.net/npm/chart.js"></script>
-            <style>
-                body {{ font-family: Arial, sans-serif; margin: 20px; }}
-                .metrics-container {{ display: grid; grid-template-columns: repeat(2, 1fr); gap: 20px; }}
-                .metric-card {{ 
-                    background: #f5f5f5; 
-                    padding: 15px; 
-                    border-radius: 8px;
-                    box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-                }}
-                .chart-container {{ margin-top: 20px; }}
-            </style>
-        </head>
-        <body>
-            <h1>Bedrock API Metrics Summary</h1>
-            
-            <div class="metrics-container">
-                <div class="metric-card">
-                    <h3>General Statistics</h3>
-                    <p>Total API Calls: {summary['total_api_calls']}</p>
-                    <p>Success Rate: {summary['success_rate']:.2f}%</p>
-                    <p>Total Retry Attempts: {summary['total_retry_attempts']}</p>
-                </div>
-                
-                <div class="metric-card">
-                    <h3>Latency</h3>
-                    <p>Average Latency: {summary['average_latency_ms']:.2f}ms</p>
-                </div>
-                
-                <div class="metric-card">
-                    <h3>Token Usage</h3>
-                    <p>Total Input Tokens: {summary['total_input_tokens']}</p>
-                    <p>Total Output Tokens: {summary['total_output_tokens']}</p>
-                    <p>Average Input Tokens: {summary['average_input_tokens']:.2f}</p>
-                    <p>Average Output Tokens: {summary['average_output_tokens']:.2f}</p>
-                </div>
-            </div>
-            
-            <div class="chart-container">
-                <canvas id="latencyChart"></canvas>
-            </div>
-            
-            <script>
-                const latencies = {[m['latency_ms'] for m in self.metrics]};
-                const requestIds = {[m['request_id'] for m in self.metrics]};
-                
-                new Chart(document.getElementById('latencyChart'), {{
-                    type: 'line',
-                    data: {{
-                        labels: requestIds,
-                        datasets: [{{
-                            label: 'Latency (ms)',
-                            data: latencies,
-                            borderColor: 'rgb(75, 192, 192)',
-                            tension: 0.1
-                        }}]
-                    }},
-                    options: {{
-                        responsive: true,
-                        plugins: {{
-                            title: {{
-                                display: true,
-                                text: 'API Call Latencies'
-                            }}
-                        }}
-                    }}
-                }});
-            </script>
-        </body>
-        </html>
-        """
+        # Report zeros rather than failing when no call reached Bedrock (e.g. every flow was unchanged)
+        summary = self.get_summary() if self._request_ids else dict.fromkeys((
+            'total_api_calls', 'average_latency_ms', 'total_input_tokens', 'total_output_tokens',
+            'average_input_tokens', 'average_output_tokens', 'total_retry_attempts', 'success_rate'
+        ), 0)
+        
+        html_content = METRICS_REPORT_TEMPLATE.substitute(
+            total_api_calls=summary['total_api_calls'],
+            success_rate=f"{summary['success_rate']:.2f}",
+            total_retry_attempts=summary['total_retry_attempts'],
+            average_latency_ms=f"{summary['average_latency_ms']:.2f}",
+            total_input_tokens=summary['total_input_tokens'],
+            total_output_tokens=summary['total_output_tokens'],
+            average_input_tokens=f"{summary['average_input_tokens']:.2f}",
+            average_output_tokens=f"{summary['average_output_tokens']:.2f}",
+            chart_width=CHART_WIDTH,
+            chart_height=CHART_HEIGHT,
+            latency_points=self._latency_points(),
+            peak_latency_ms=max(self._latency, default=0)
+        )
         
-        with open(filename, 'w') as f:
+        with open(filename, 'w', buffering=1 << 20) as f:
             f.write(html_content)
 
+# lru_cache lets concurrent misses all build clients, so the first call is serialised
+_AWS_CLIENTS_LOCK = threading.Lock()
+
 def get_aws_clients():
-    """Initialize and return AWS clients"""
+    """Initialize and return AWS clients
+    
+    Cached per process: boto3 clients are thread-safe and the account ID never
+    changes, so the client setup and STS call happen only once, even when worker
+    threads race for the first call.
+    """
+    with _AWS_CLIENTS_LOCK:
+        return _create_aws_clients()
+
+@functools.lru_cache(maxsize=1)
+def _create_aws_clients():
+    # Also keeps the default boto3 session, which is not thread-safe, to one thread at a time
+    # Imported on first use so entry points that never reach AWS skip the boto3 import cost
+    import boto3
+    from botocore.config import Config
+    
+    # Adaptive mode adds client-side rate limiting that backs off on throttling responses
     botoConfig = Config(
         region_name = 'us-east-1',
         retries = {
-            'max_attempts': 10,
+            'max_attempts': 8,
             'mode': 'adaptive'
-        }
+        },
+        read_timeout = 300,
+        connect_timeout = 10
     )
     
     bedrock_runtime = boto3.client('bedrock-runtime', config=botoConfig)
@@ -222,35 +288,6 @@ def get_aws_clients():
     
     return bedrock_runtime, account_id
 
-def invoke_bedrock_with_retries(bedrock_runtime, account_id, request, max_retries=10, rate_limiter=None):
-    """Invoke Bedrock with retries and exponential backoff"""
-    base_delay = 1  # Start with 1 second delay
-    
-    # Estimate tokens in request (rough estimation)
-    estimated_tokens = len(str(request)) / 4  # Rough estimation of tokens
-    
-    for attempt in range(max_retries):
-        try:
-            if rate_limiter:
-                rate_limiter.wait_for_tokens(estimated_tokens)
-                
-            response = bedrock_runtime.invoke_model(
-                modelId=f"arn:aws:bedrock:us-east-1:{account_id}:inference-profile/us.anthropic.claude-3-5-sonnet-20241022-v2:0",
-                body=json.dumps(request)
-            )
-            return response
-            
-        except ClientError as e:
-            if e.response['Error']['Code'] == 'ThrottlingException':
-                if attempt == max_retries - 1:
-                    raise  # Re-raise the exception if we're out of retries
-                    
-                # Calculate delay with exponential backoff and jitter
-                delay = (base_delay * (2 ** attempt)) + (random.random() * 0.1)
-                time.sleep(delay)
-                continue
-            else:
-                raise
-            
-
-       
+def inference_profile_arn(account_id):
+    """Return the ARN of the Claude cross-region inference profile used for comparisons"""
+    return f"arn:aws:bedrock:us-east-1:{account_id}:inference-profile/us.anthropic.claude-3-5-sonnet-20241022-v2:0"
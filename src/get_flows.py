@@ -21,66 +21,44 @@ Required Environment:
 
 import argparse
 import base64
+import functools
+import html
 import json
 import logging
 import os
+import re
 import sys
-from pathlib import Path
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path, PurePosixPath
+from typing import TYPE_CHECKING
 
-from ghapi.all import GhApi
+from bedrock_utils import BedrockMetricsCollector, configure_logging, dumps_json, get_aws_clients, inference_profile_arn, loads_json
 
-from bedrock_utils import BedrockMetricsCollector, TokenRateLimiter, get_aws_clients, invoke_bedrock_with_retries
+if TYPE_CHECKING:
+    from ghapi.all import GhApi
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
-def extract_code_simple(response):
-    """
-    Extracts code blocks from a text response containing markdown-style code blocks.
-    
-    Args:
-        response (str): Text containing markdown code blocks delimited by ```
-        
-    Returns:
-        list: List of extracted code block contents
-    """
-    try:
-        # Split by code block markers and get content between them
-        code_blocks = response.split('```')[1::2]
-        # Remove language identifier if present
-        return [block.split('\n', 1)[1] if '\n' in block else block 
-                for block in code_blocks]
-    except IndexError:
-        logger.warning("No code blocks found in response")
-        return []
-       
-def compare_contact_flows(fileName: str, file1_path: str, file2_path: str) -> str:
-    """
-    Compares two contact flow JSON files and generates an HTML visualization using Mermaid diagrams.
-    
-    Args:
-        fileName (str): Base name for output files
-        file1_path (str): Path to original contact flow JSON
-        file2_path (str): Path to modified contact flow JSON
-        
-    Returns:
-        str: Generated HTML content containing the comparison visualization
-        
-    Raises:
-        Exception: If file reading or Bedrock API call fails
-    """
-    
-    # Read and load the JSON files
-    try:
-        with open(file1_path, 'r') as f1, open(file2_path, 'r') as f2:
-            flow1 = json.load(f1)
-            flow2 = json.load(f2)
-    except Exception as e:
-        raise Exception(f"Error reading input files: {str(e)}") from e
-    htmlTemplate = '''  <!DOCTYPE html>
+# Upper bound on contact flows processed concurrently
+MAX_WORKERS = 8
+
+# Commit file statuses whose contact flows are compared
+COMPARED_FILE_STATUSES = frozenset({'added', 'modified'})
+
+# Contact flows compared per Bedrock call, keeping the combined output within the model's limit
+COMPARISON_BATCH_SIZE = 4
+
+# Set to "true" to mark the static instructions as a prompt cache checkpoint. Off by default:
+# prompt caching availability for the comparison model's inference profile is unconfirmed,
+# and the instructions may fall below the model's minimum cacheable prompt length
+PROMPT_CACHING_ENV_VAR = "BEDROCK_PROMPT_CACHING"
+
+# Markdown code block body, skipping an optional language identifier line
+CODE_BLOCK_RE = re.compile(r"```(?:[^\n`]*\n)?(.*?)```", re.DOTALL)
+
+# Page shell for each comparison; the model only supplies the diagram and the list of changes
+COMPARISON_HTML_TEMPLATE = '''  <!DOCTYPE html>
 <html>
 <head>
     <title>ACME Contact Flow Comparison</title>
@@ -107,6 +85,43 @@ def compare_contact_flows(fileName: str, file1_path: str, file2_path: str) -> st
     <h1>ACME Contact Flow Comparison</h1>
     <div class="flow-container">
         <div class="mermaid">
+<!--MERMAID-->
+        </div>
+    </div>
+
+    <div style="margin-top: 30px; padding: 20px; background: white; border-radius: 8px;">
+        <h2>Detailed Changes:</h2>
+        <ul>
+<!--SUMMARY-->
+        </ul>
+    </div>
+
+    <script>
+        mermaid.initialize({
+            theme: 'default',
+            securityLevel: 'loose',
+            startOnLoad: true,
+            flowchart: {
+                useMaxWidth: true,
+                htmlLabels: true,
+                curve: 'basis'
+            }
+        });
+    </script>
+</body>
+</html>'''
+
+# Marks a key present on only one side of a diff
+_MISSING = object()
+
+# Comparison rendered when both versions are identical
+NO_CHANGES_COMPARISON = {
+    "mermaid": "flowchart TD\n    NoChanges[No changes between versions]",
+    "summary_items": ["No changes detected"]
+}
+
+# Example diagram showing the model the expected structure and styling
+EXAMPLE_MERMAID = """
         flowchart TD
             subgraph Flow1[Original Flow]
                 A1[Start] --> B1[Update Flow Logging]
@@ -155,105 +170,378 @@ def compare_contact_flows(fileName: str, file1_path: str, file2_path: str) -> st
 
             classDef removed fill:#ff6b6b,stroke:#333,color:white
             classDef added fill:#4CAF50,stroke:#333,color:white
-        </div>
-    </div>
-
-    <div style="margin-top: 30px; padding: 20px; background: white; border-radius: 8px;">
-        <h2>Detailed Changes:</h2>
-        <ul>
-            <li>Removed Lambda function invocation (acme-exampleFunction)</li>
-            <li>Added new Welcome Message block before Transfer to Flow</li>
-            <li>Queue ARNs changed from dynamic (FlowAttributes.sales/finance) to static ARNs</li>
-            <li>Flow Module name explicitly set to "VMX3-CoreFlowModule-tfdemo-dev-use1-amzconnect"</li>
-            <li>Flow attributes structure remained same but implementation changed</li>
-            <li>Error handling paths remained consistent</li>
-            <li>Lex Bot integration parameters unchanged</li>
-            <li>Contact Event Hooks configuration maintained</li>
-        </ul>
-    </div>
+            classDef changed fill:#FFA500,stroke:#333,color:white
+"""
 
-    <script>
-        mermaid.initialize({
-            theme: 'default',
-            securityLevel: 'loose',
-            startOnLoad: true,
-            flowchart: {
-                useMaxWidth: true,
-                htmlLabels: true,
-                curve: 'basis'
-            }
-        });
-    </script>
-</body>
-</html>'''
-    # Prepare the prompt
-    prompt = f"""
-    Compare these two contact flows and:
-    Flow 1: {json.dumps(flow1, indent=2)}
-    Flow 2: {json.dumps(flow2, indent=2)}
-    
-    <htmlTemplate>
-    {htmlTemplate}
-    </htmlTemplate>
-    
-    - create a visual representation of the differences between the first and second contact flows using Mermaid flow charts. 
-    - Include detailed summary at bottom of what changed and embed summary into diagram. 
+# Comparison instructions, identical for every call so Bedrock can cache them as the prompt prefix
+COMPARISON_INSTRUCTIONS = """
+    You will be given the differences between the original and modified versions of one or more contact flows, each within <flow> tags after these instructions. For each flow:
+    
+    <exampleMermaid>
+    {example_mermaid}
+    </exampleMermaid>
+    
+    - create a visual representation of the differences between the first and second contact flows as a Mermaid flow chart. 
+    - Include a summary subgraph in the diagram of what changed. 
     - when using the blocks for invoke module, invoke lambda, or tranfer to flow make sure to call out the module name, lambda function name, or flow respectively. 
     - Make sure to highlight the items that have changed between the two flows by making the actions that were removed from first flow red and actions added to second flow green. If an action merely changed, make it orange.
-    - IMPORTANT: Create a detailed summary of all items that changed between the two flows, including arns, parameters, etc., and embed at bottom of diagram. No change is too small. 
-    - If the first flow is empty, assume that this is a brand new contact flow.
-    - Embed the mermaid image into an html web page. 
-    - Use the html within the <htmlTemplate> tags as a guide for how it should be configured. The only differences from the template should be the actual mermaid diagrams and summary.
-    - ALWAYS provide the complete HTML in markdown code blocks delimited by ```. Do not ask if you should provide anything.
+    - IMPORTANT: Create a detailed list of all items that changed between the two flows, including arns, parameters, etc. No change is too small. 
+    - If every action was added, assume that this is a brand new contact flow.
+    - Use the diagram within the <exampleMermaid> tags as a guide for how it should be structured, including the classDef styles.
+    - ALWAYS respond with only a JSON array holding one object per flow, in the order given, each of the form {{"mermaid": "<flow chart definition>", "summary_items": ["<change>", ...]}}. Do not include HTML, markdown code fences or any other text.
+    """.format(example_mermaid=EXAMPLE_MERMAID)
+
+# Changing tail of the comparison prompt; the per-flow sections are substituted per call
+COMPARISON_FLOWS_TEMPLATE = """
+    Compare the original and modified versions of each of the {count} contact flows below:
+    {flows}
     """
 
-    # Prepare the request for Bedrock
-    request = {
-        "anthropic_version": "bedrock-2023-05-31",
-        "max_tokens": 4096,
-        "messages": [
-            {
-                "role": "user",
-                "content": prompt
-            }
-        ],
-        "temperature": 0,
-        "top_p": 0.99
+# Per-flow section of the comparison prompt
+FLOW_CHANGES_TEMPLATE = """
+    <flow index="{index}">
+    Changes (actions are keyed by Identifier; changed values are listed by path): {diff}
+    Modified flow outline as [Identifier, Type, [next action Identifiers]]: {outline}
+    </flow>"""
+
+# Request fields shared by every comparison call; max_tokens is the output budget per flow
+BEDROCK_REQUEST_PARAMETERS = {
+    "anthropic_version": "bedrock-2023-05-31",
+    "max_tokens": 1500,
+    "temperature": 0,
+    "top_p": 0.99
+}
+
+# Output budget for a single flow whose comparison didn't fit in max_tokens above
+TRUNCATED_FLOW_MAX_TOKENS = 4096
+
+# Static parts of the index page linking every comparison report
+INDEX_HTML_HEADER = '''
+            <html>
+            <head>
+                <title>Contact Flow Comparison</title>
+                <style>
+                    body { font-family: Arial, sans-serif; margin: 20px; }
+                    h1 { color: #333; }
+                    .link-list { margin: 20px 0; }
+                    a { color: #0066cc; text-decoration: none; display: block; margin: 10px 0; }
+                    a:hover { text-decoration: underline; }
+                </style>
+            </head>
+            <body>
+            '''
+INDEX_HTML_FOOTER = '''<a href="./bedrock_metrics.html">View API Metrics Report</a>
+                </div>
+            </body>
+            </html>
+            '''
+
+def extract_code_simple(response):
+    """
+    Extracts code blocks from a text response containing markdown-style code blocks.
+    
+    Args:
+        response (str): Text containing markdown code blocks delimited by ```
+        
+    Returns:
+        list: List of extracted code block contents
+    """
+    return CODE_BLOCK_RE.findall(response)
+       
+def _index_actions(flow):
+    """Maps each action of a flow to its Identifier, falling back to its position"""
+    return {action.get('Identifier', f'#{index}'): action for index, action in enumerate(flow.get('Actions', []))}
+
+def _diff_values(path, old, new, changes):
+    """Appends a {"path", "old", "new"} entry for every leaf value that differs"""
+    if old == new:
+        return
+    if isinstance(old, dict) and isinstance(new, dict):
+        for key in [*old, *(key for key in new if key not in old)]:
+            _diff_values(f"{path}.{key}" if path else key, old.get(key, _MISSING), new.get(key, _MISSING), changes)
+    elif isinstance(old, list) and isinstance(new, list) and len(old) == len(new):
+        for index, (old_item, new_item) in enumerate(zip(old, new, strict=True)):
+            _diff_values(f"{path}[{index}]", old_item, new_item, changes)
+    else:
+        change = {'path': path}
+        if old is not _MISSING:
+            change['old'] = old
+        if new is not _MISSING:
+            change['new'] = new
+        changes.append(change)
+
+def compute_flow_diff(flow1, flow2):
+    """
+    Computes the structural differences between two contact flows.
+    
+    Args:
+        flow1 (dict): Original contact flow
+        flow2 (dict): Modified contact flow
+        
+    Returns:
+        dict: {"added": [actions], "removed": [actions], "changed": [{"path", "old", "new"}]}
+        where action paths start with the action Identifier
+    """
+    actions1 = _index_actions(flow1)
+    actions2 = _index_actions(flow2)
+    
+    changed = []
+    _diff_values('', {k: v for k, v in flow1.items() if k != 'Actions'}, {k: v for k, v in flow2.items() if k != 'Actions'}, changed)
+    for identifier, action in actions2.items():
+        if identifier in actions1:
+            _diff_values(identifier, actions1[identifier], action, changed)
+    
+    return {
+        'added': [action for identifier, action in actions2.items() if identifier not in actions1],
+        'removed': [action for identifier, action in actions1.items() if identifier not in actions2],
+        'changed': changed
     }
 
+def _next_actions(transitions):
+    """Collects every NextAction target referenced from an action's Transitions"""
+    if isinstance(transitions, dict):
+        targets = [transitions['NextAction']] if 'NextAction' in transitions else []
+        for value in transitions.values():
+            targets.extend(_next_actions(value))
+        return targets
+    if isinstance(transitions, list):
+        return [target for item in transitions for target in _next_actions(item)]
+    return []
+
+def flow_outline(flow):
+    """Summarizes a flow as [Identifier, Type, [next action Identifiers]] entries"""
+    return [
+        [identifier, action.get('Type'), list(dict.fromkeys(_next_actions(action.get('Transitions', {}))))]
+        for identifier, action in _index_actions(flow).items()
+    ]
+
+@functools.lru_cache(maxsize=64)
+def flow_changes(flow1_text, flow2_text):
+    """
+    Computes the prompt inputs for two serialized versions of a contact flow. The structural
+    diff is computed locally so the model only receives what changed. Memoized on the flow
+    contents, so re-runs over the same versions skip the parse and diff.
+    
+    Args:
+        flow1_text (str): Original contact flow JSON
+        flow2_text (str): Modified contact flow JSON
+        
+    Returns:
+        tuple | None: (compact diff JSON, compact outline JSON of the modified flow), or None if
+            the versions don't differ
+    """
+    if flow1_text == flow2_text:
+        return None
+    flow1 = loads_json(flow1_text)
+    flow2 = loads_json(flow2_text)
+    diff = compute_flow_diff(flow1, flow2)
+    if not any(diff.values()):
+        return None
+    return json.dumps(diff, separators=(',', ':')), json.dumps(flow_outline(flow2), separators=(',', ':'))
+
+def _validate_comparison(comparison):
+    if not isinstance(comparison['mermaid'], str) or not isinstance(comparison['summary_items'], list):
+        raise TypeError("unexpected comparison field types")
+    return comparison
+
+def parse_comparison(response):
+    """
+    Parses the model's JSON comparison, tolerating any text around the object.
+    
+    Args:
+        response (str): Model response containing {"mermaid": ..., "summary_items": [...]}
+        
+    Returns:
+        dict: The parsed comparison
+        
+    Raises:
+        Exception: If the response does not contain a valid comparison
+    """
+    return parse_comparisons(response, 1)[0]
+
+def parse_comparisons(response, count):
+    """
+    Parses the model's JSON array of comparisons (or a lone object when one was requested),
+    tolerating any text around it.
+    
+    Args:
+        response (str): Model response containing [{"mermaid": ..., "summary_items": [...]}, ...]
+        count (int): Number of comparisons requested
+        
+    Returns:
+        list: The parsed comparisons, in request order
+        
+    Raises:
+        Exception: If the response does not contain exactly count valid comparisons
+    """
     try:
-      
-        #Initialize AWS Clients
-        bedrock_runtime, account_id = get_aws_clients()
-        # Initialize utilities
-        rate_limiter = TokenRateLimiter(tokens_per_minute=400000)
-        response = invoke_bedrock_with_retries(bedrock_runtime, account_id, request, rate_limiter=rate_limiter)
+        # Whichever bracket comes first decides between an array and a single object
+        array_start, object_start = response.find('['), response.find('{')
+        if array_start != -1 and (object_start == -1 or array_start < object_start):
+            comparisons = loads_json(response[array_start:response.rfind(']') + 1])
+        else:
+            comparisons = [loads_json(response[object_start:response.rfind('}') + 1])]
+        if len(comparisons) != count:
+            raise ValueError(f"expected {count} comparisons, got {len(comparisons)}")
+        return [_validate_comparison(comparison) for comparison in comparisons]
+    except (ValueError, KeyError, TypeError) as e:
+        raise Exception(f"No comparison content generated from Bedrock response: {str(e)}") from e
+
+def render_comparison_html(comparison):
+    """
+    Stitches the model's diagram and change list into the comparison page template.
+    
+    Args:
+        comparison (dict): Parsed comparison with "mermaid" and "summary_items"
         
-        # Parse the response
-        response_body = json.loads(response['body'].read())
-        resp_metadata = response['ResponseMetadata']
+    Returns:
+        str: Complete HTML page
+    """
+    summary = '\n'.join(f'            <li>{html.escape(str(item))}</li>' for item in comparison['summary_items'])
+    return COMPARISON_HTML_TEMPLATE.replace('<!--MERMAID-->', comparison['mermaid']).replace('<!--SUMMARY-->', summary)
+
+class ComparisonTruncatedError(Exception):
+    """Raised when Bedrock stops at max_tokens before finishing the comparisons of a batch"""
+    
+    def __init__(self, message, resp_metadata):
+        super().__init__(message)
+        self.resp_metadata = resp_metadata
+
+def compare_contact_flow_batch(
+    comparisons: list[tuple[str, str, str]],
+    max_tokens_per_flow: int = BEDROCK_REQUEST_PARAMETERS["max_tokens"]
+) -> tuple[list[str], dict]:
+    """
+    Compares several pairs of contact flow JSON files with a single Bedrock call and writes
+    an HTML visualization using Mermaid diagrams for each of them.
+    
+    Args:
+        comparisons (list): (fileName, file1_path, file2_path) tuples, where fileName is the
+            base name for the output file and the paths point at the original and modified flows
+        max_tokens_per_flow (int): Output token budget for each flow sent to Bedrock
         
-        bedrock_response = response_body['content'][0]['text']
-        logger.info("Model response:")
-        logger.info(bedrock_response)
-        logger.info("Response Metadata:")
-        logger.info(resp_metadata)
-
-        generated_html = extract_code_simple(bedrock_response)
-        if not generated_html:
-            raise Exception("No HTML content generated from Bedrock response")
+    Returns:
+        tuple: (generated HTML pages in input order, response metadata or {} if Bedrock wasn't called)
         
+    Raises:
+        ComparisonTruncatedError: If the model ran out of output tokens
+        Exception: If file reading or Bedrock API call fails
+    """
+    pages = [None] * len(comparisons)
+    flow_sections = []
+    pending = []
+    
+    for index, (fileName, file1_path, file2_path) in enumerate(comparisons):
+        # Read the JSON files
+        try:
+            changes = flow_changes(Path(file1_path).read_text(), Path(file2_path).read_text())
+        except Exception as e:
+            raise Exception(f"Error reading input files: {str(e)}") from e
         
-        output_path = Path(f'{fileName}.html')
-        output_path.write_text(generated_html[0])
+        # Identical versions need no model call; report that nothing changed
+        if changes is None:
+            logger.info(f"No changes between versions of {fileName}, skipping Bedrock")
+            pages[index] = render_comparison_html(NO_CHANGES_COMPARISON)
+            continue
         
-        return generated_html, resp_metadata
-                
-    except Exception as e:
-        logger.error(f"Error invoking Bedrock: {str(e)}")
-        raise #Exception(f"Error invoking Bedrock: {str(e)}") from e
+        pending.append(index)
+        flow_sections.append(FLOW_CHANGES_TEMPLATE.format(index=len(pending), diff=changes[0], outline=changes[1]))
+    
+    resp_metadata = {}
+    if pending:
+        # Prepare the prompt: the static instructions come first, so only the flows at the end
+        # differ between calls and the instructions can serve as a cache checkpoint
+        instructions = {"type": "text", "text": COMPARISON_INSTRUCTIONS}
+        if os.environ.get(PROMPT_CACHING_ENV_VAR, '').lower() == 'true':
+            instructions["cache_control"] = {"type": "ephemeral"}
+        prompt = [
+            instructions,
+            {
+                "type": "text",
+                "text": COMPARISON_FLOWS_TEMPLATE.format(count=len(pending), flows=''.join(flow_sections))
+            }
+        ]
+
+        # Prepare the request for Bedrock, with an output budget for every flow in the batch
+        request = {
+            **BEDROCK_REQUEST_PARAMETERS,
+            "max_tokens": max_tokens_per_flow * len(pending),
+            "messages": [
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ]
+        }
+
+        try:
+          
+            #Initialize AWS Clients
+            bedrock_runtime, account_id = get_aws_clients()
+            # The client's adaptive retry mode paces requests and retries throttling itself
+            response = bedrock_runtime.invoke_model(
+                modelId=inference_profile_arn(account_id),
+                body=dumps_json(request)
+            )
+            
+            # Parse the response
+            response_body = loads_json(response['body'].read())
+            resp_metadata = response['ResponseMetadata']
+            
+            bedrock_response = response_body['content'][0]['text']
+            # The full output is only formatted when debug logging is enabled
+            logger.info(
+                "Bedrock call: %d output chars, %s output tokens",
+                len(bedrock_response),
+                resp_metadata.get('HTTPHeaders', {}).get('x-amzn-bedrock-output-token-count')
+            )
+            logger.debug("Model response: %s", bedrock_response)
+            logger.debug("Response Metadata: %s", resp_metadata)
+            
+            # A truncated answer can't be parsed; report it as such rather than as a malformed reply
+            if response_body.get('stop_reason') == 'max_tokens':
+                raise ComparisonTruncatedError(
+                    f"Bedrock response for {len(pending)} flow(s) was cut off at {request['max_tokens']} output tokens",
+                    resp_metadata
+                )
+
+            for index, comparison in zip(pending, parse_comparisons(bedrock_response, len(pending)), strict=True):
+                pages[index] = render_comparison_html(comparison)
+                    
+        except Exception as e:
+            logger.error(f"Error invoking Bedrock: {str(e)}")
+            raise #Exception(f"Error invoking Bedrock: {str(e)}") from e
+    
+    for (fileName, _, _), page in zip(comparisons, pages, strict=True):
+        Path(f'{fileName}.html').write_text(page)
+    
+    return pages, resp_metadata
+
+def compare_contact_flows(fileName: str, file1_path: str, file2_path: str) -> tuple[list[str], dict]:
+    """
+    Compares two contact flow JSON files and generates an HTML visualization using Mermaid diagrams.
+    
+    Args:
+        fileName (str): Base name for output files
+        file1_path (str): Path to original contact flow JSON
+        file2_path (str): Path to modified contact flow JSON
         
+    Returns:
+        tuple: ([generated HTML page], response metadata or {} if Bedrock wasn't called)
         
+    Raises:
+        Exception: If file reading or Bedrock API call fails
+    """
+    return compare_contact_flow_batch([(fileName, file1_path, file2_path)])
+        
+        
+
+@functools.lru_cache(maxsize=4)
+def _api(token: str) -> "GhApi":
+    """Returns a GitHub API client per token, so the API spec is only loaded once per run"""
+    # Imported on first use: ghapi parses the whole GitHub API spec at import time
+    from ghapi.all import GhApi
+    return GhApi(token=token)
 
 def get_file_paths(
     token: str,
@@ -261,7 +549,7 @@ def get_file_paths(
     repo: str,
     commit_sha: str,
     contact_flow_path: str
-) -> list[str]:
+) -> tuple[list[str], str | None]:
     """
     Retrieves paths of modified contact flow files from a specific GitHub commit.
     
@@ -273,29 +561,30 @@ def get_file_paths(
         contact_flow_path (str): Base path for contact flow files
         
     Returns:
-        list: List of modified file paths
+        tuple: (modified file paths, parent commit SHA or None for a root commit)
     """
     # Initialize GitHub API client
-    api = GhApi(token=token)
+    api = _api(token)
     
     # Get commit details
     commit = api.repos.get_commit(owner=owner, repo=repo, ref=commit_sha)
     
-    filePaths = []
-    for file in commit.files:
-        if file.filename.startswith(contact_flow_path):
-            if file.status in ('added', 'modified'):
-                logger.info(f"File: {file.filename}, Status: {file.status}")
-                filePaths.append(file.filename)
+    filePaths = [
+        file.filename for file in commit.files
+        if file.status in COMPARED_FILE_STATUSES and file.filename.startswith(contact_flow_path)
+    ]
+    logger.info(f"{len(filePaths)} of {len(commit.files)} changed files are contact flows to compare")
     
-    return filePaths
+    parent_sha = commit.parents[0].sha if commit.parents else None
+    return filePaths, parent_sha
 
 def get_file_versions(
     token: str,
     owner: str,
     repo: str,
     commit_sha: str,
-    file_path: str
+    file_path: str,
+    parent_sha: str | None
 ) -> tuple[str | None, str | None]:
     """
     Retrieves original and modified versions of a file from GitHub.
@@ -306,18 +595,13 @@ def get_file_versions(
         repo (str): Repository name
         commit_sha (str): Commit hash
         file_path (str): Path to the file
+        parent_sha (str | None): Parent commit hash, as returned by get_file_paths
         
     Returns:
         tuple: (original_content, modified_content) or (None, None) if retrieval fails
     """
     # Initialize GitHub API client
-    api = GhApi(token=token)
-    
-    # Get commit details
-    commit = api.repos.get_commit(owner=owner, repo=repo, ref=commit_sha)
-    
-    # Get parent commit SHA
-    parent_sha = commit.parents[0].sha if commit.parents else None
+    api = _api(token)
     
     try:
         # Get original content (from parent commit)
@@ -330,7 +614,6 @@ def get_file_versions(
             )
             
             original_content = base64.b64decode(original_response.content).decode('utf-8')
-            logger.info(f"original_content: {original_content}")
         except Exception as e:
             if hasattr(e, 'status') and e.status == 404:  # File doesn't exist in parent commit (new file)
                 original_content = "{}"
@@ -346,8 +629,8 @@ def get_file_versions(
         )
         modified_content = base64.b64decode(modified_response.content).decode('utf-8')
         
-        logger.debug("original_content: ", original_content)
-        logger.debug("modified_content: ", modified_content)
+        logger.debug("original_content: %s", original_content)
+        logger.debug("modified_content: %s", modified_content)
         return original_content, modified_content
     
     except Exception as e:
@@ -361,17 +644,128 @@ def save_versions(
     modified_path: str
 ) -> None:
     try:
-        with open(original_path, 'w') as f:
-            f.write(original)
-        with open(modified_path, 'w') as f:
-            f.write(modified)
+        Path(original_path).write_text(original, encoding='utf-8')
+        Path(modified_path).write_text(modified, encoding='utf-8')
         logger.info(f"Files saved successfully:\n- Original: {original_path}\n- Modified: {modified_path}")
     except Exception as e:
         logger.error(f"Error saving files: {e}")
         raise
 
 
+def output_basenames(filepaths):
+    """
+    Chooses a distinct output base name for every contact flow, as all outputs share one directory.
+    
+    Args:
+        filepaths (list): Repository paths of the contact flows
+        
+    Returns:
+        list: The file stem where it is unique, otherwise the stem qualified by its directories
+    """
+    stems = Counter(PurePosixPath(file).stem for file in filepaths)
+    taken = set()
+    names = []
+    for file in filepaths:
+        path = PurePosixPath(file)
+        name = path.stem if stems[path.stem] == 1 else '_'.join((*path.parent.parts, path.stem))
+        # Guard against a qualified name matching another file's name
+        candidate, suffix = name, 1
+        while candidate in taken:
+            suffix += 1
+            candidate = f"{name}-{suffix}"
+        taken.add(candidate)
+        names.append(candidate)
+    return names
+
+def prepare_file(args, file, base_filename, parent_sha):
+    """
+    Retrieves and saves both versions of a contact flow for comparison under base_filename.
+    
+    Returns:
+        tuple | None: (base_filename, original_path, modified_path), or None if the content is unchanged
+    """
+    logger.info(f"Retrieving file: {file}")
+    original, modified = get_file_versions(
+        args.token,
+        args.owner,
+        args.repo,
+        args.commit,
+        file,
+        parent_sha
+    )
+    
+    if original is None or modified is None:
+        logger.error("Failed to retrieve file versions")
+        sys.exit(1)
+    
+    if original == modified:
+        logger.info(f"Content of {file} is unchanged, skipping comparison")
+        return None
+    
+    path = PurePosixPath(file)
+    logger.info(f"Filename: {path.name}")
+    
+    # Generate output file paths
+    original_path = f"{base_filename}_original{path.suffix}"
+    modified_path = f"{base_filename}_modified{path.suffix}"
+    
+    logger.debug("Output paths for %s: %s, %s", base_filename, original_path, modified_path)
+    
+    # Save files
+    save_versions(original, modified, original_path, modified_path)
+    
+    return base_filename, original_path, modified_path
+
+def _compare_with_larger_budget(comparison, error, call_metadata):
+    # Retries a single truncated flow once; a second truncation is raised
+    logger.warning(f"{error}; retrying with {TRUNCATED_FLOW_MAX_TOKENS} output tokens")
+    pages, resp_metadata = compare_contact_flow_batch([comparison], TRUNCATED_FLOW_MAX_TOKENS)
+    call_metadata.append(resp_metadata)
+    return pages[0]
+
+def _compare_flow_alone(comparison, call_metadata):
+    # Compares one flow in its own call, appending the metadata of every call made
+    try:
+        pages, resp_metadata = compare_contact_flow_batch([comparison])
+    except ComparisonTruncatedError as e:
+        call_metadata.append(e.resp_metadata)
+        return _compare_with_larger_budget(comparison, e, call_metadata)
+    call_metadata.append(resp_metadata)
+    return pages[0]
+
+def compare_batch(comparisons, metrics_collector):
+    """
+    Compares a batch of saved contact flows with one Bedrock call and records its metrics.
+    
+    Returns:
+        list: Names of the generated comparison HTML files
+    """
+    call_metadata = []
+    try:
+        html_result, resp_metadata = compare_contact_flow_batch(comparisons)
+        call_metadata.append(resp_metadata)
+    except ComparisonTruncatedError as e:
+        call_metadata.append(e.resp_metadata)
+        if len(comparisons) == 1:
+            html_result = [_compare_with_larger_budget(comparisons[0], e, call_metadata)]
+        else:
+            # Give every flow the full output budget of its own call
+            logger.warning(f"{e}; comparing the batch one flow at a time")
+            html_result = [_compare_flow_alone(comparison, call_metadata) for comparison in comparisons]
+    
+    # Collect metrics (the collector is safe to share between workers); skipped comparisons have none
+    for resp_metadata in call_metadata:
+        if resp_metadata:
+            metrics_collector.add_metric(resp_metadata)
+    
+    results = [f"{base_filename}.html" for (base_filename, _, _), page in zip(comparisons, html_result, strict=True) if page]
+    logger.info(f"Comparison complete! Results saved to {results}")
+    return results
+
+
 def main():
+    configure_logging()
+    
     # Set up argument parser
     parser = argparse.ArgumentParser(description='Download original and modified versions of a file from a GitHub commit')
     
@@ -412,7 +806,7 @@ def main():
     # Initialize Metrics Collection
     metrics_collector = BedrockMetricsCollector()
     
-    filepaths  = get_file_paths(
+    filepaths, parent_sha = get_file_paths(
         args.token,
         args.owner,
         args.repo,
@@ -420,44 +814,26 @@ def main():
         args.contact_flow_path
     )
     logger.info(f"Filepaths: {filepaths}")
-    html_results = []
-    for file in filepaths:
-      logger.info(f"Retrieving file: {file}")
-      original, modified = get_file_versions(
-          args.token,
-          args.owner,
-          args.repo,
-          args.commit,
-          file
-      )
-    
-      if original is None or modified is None:
-        logger.error("Failed to retrieve file versions")
-        sys.exit(1)
-    
-      fileName = file.split("/")[-1]
-      logger.info(f"Filename: {fileName}")
-
-      # Generate output file paths
-      base_filename = os.path.basename(fileName.split(".")[0])
-      file_extension = fileName.split(".")[-1]
-      original_path = ".".join([f"{base_filename}_original", file_extension])
-      modified_path = ".".join([f"{base_filename}_modified", file_extension])
-      
-      logger.debug(base_filename, original_path, modified_path)
-
-      # Save files
-      save_versions(original, modified, original_path, modified_path)
-      
-      html_result, resp_metadata = compare_contact_flows(base_filename, original_path, modified_path)
-      
-      if html_result:
-        html_results.append(f"{base_filename}.html")
-      # Collect metrics
-      
-      metrics_collector.add_metric(resp_metadata)
-        
-      logger.info(f"Comparison complete! Results saved to {base_filename}.html")
+    # Files are fetched concurrently, then compared in batches so several flows share each
+    # Bedrock call; map keeps the results in commit order for the index page
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        comparisons = [
+            prepared for prepared in executor.map(
+                lambda file, base_filename: prepare_file(args, file, base_filename, parent_sha),
+                filepaths,
+                output_basenames(filepaths)
+            )
+            if prepared
+        ]
+        batches = [
+            comparisons[start:start + COMPARISON_BATCH_SIZE]
+            for start in range(0, len(comparisons), COMPARISON_BATCH_SIZE)
+        ]
+        html_results = [
+            result
+            for results in executor.map(lambda batch: compare_batch(batch, metrics_collector), batches)
+            for result in results
+        ]
     
     # Process Bedrock Metrics
     metrics_collector.save_metrics()
@@ -465,31 +841,11 @@ def main():
     # Create index.html after processing all files
     logger.info(f"html_results: {html_results}")
     if html_results:
-        with open('index.html', 'w') as f:
-            f.write('''
-            <html>
-            <head>
-                <title>Contact Flow Comparison</title>
-                <style>
-                    body { font-family: Arial, sans-serif; margin: 20px; }
-                    h1 { color: #333; }
-                    .link-list { margin: 20px 0; }
-                    a { color: #0066cc; text-decoration: none; display: block; margin: 10px 0; }
-                    a:hover { text-decoration: underline; }
-                </style>
-            </head>
-            <body>
-            ''')
-            f.write(f'  <h1>Contact Flow Comparison Results for Commit {args.commit}</h1>')
-            f.write('  <div class="link-list">')
-            for result in html_results:
-                f.write(f'      <a href="./{result}">{result}</a>\n')
-            f.write('<a href="./bedrock_metrics.html">View API Metrics Report</a>')
-            f.write('''
-                </div>
-            </body>
-            </html>
-            ''')
+        links = ''.join(f'      <a href="./{result}">{result}</a>\n' for result in html_results)
+        Path('index.html').write_text(
+            f'{INDEX_HTML_HEADER}  <h1>Contact Flow Comparison Results for Commit {args.commit}</h1>'
+            f'  <div class="link-list">{links}{INDEX_HTML_FOOTER}'
+        )
     logger.info("Index.html has been created with links to all comparison results.")
       
 
@@ -10,5 +10,20 @@ def ignore_datetime_warnings():
     warnings.filterwarnings("ignore", category=DeprecationWarning, message="datetime.datetime.utcnow()")
     warnings.filterwarnings("ignore", category=DeprecationWarning, module="botocore.auth")
 
+@pytest.fixture(autouse=True)
+def run_in_tmp_path(tmp_path, monkeypatch):
+    # Reports, metrics and saved flows are written to the working directory, so keep them out of the repository
+    monkeypatch.chdir(tmp_path)
+
+@pytest.fixture(autouse=True)
+def clear_client_caches():
+    # AWS and GitHub clients are cached per process, so don't let mocked clients leak between tests
+    import bedrock_utils
+    import src.bedrock_utils
+    import src.get_flows
+    bedrock_utils._create_aws_clients.cache_clear()
+    src.bedrock_utils._create_aws_clients.cache_clear()
+    src.get_flows._api.cache_clear()
+
 # Add the src directory to Python path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
@@ -1,18 +1,11 @@
+import json
+import threading
 import time
-from unittest.mock import Mock
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
 
-from botocore.exceptions import ClientError
+from src.bedrock_utils import BedrockMetricsCollector, get_aws_clients, loads_json
 
-from src.bedrock_utils import BedrockMetricsCollector, TokenRateLimiter, invoke_bedrock_with_retries
-
-
-def test_token_rate_limiter():
-    limiter = TokenRateLimiter(tokens_per_minute=100)
-    start_time = time.time()
-    limiter.wait_for_tokens(50)
-    limiter.wait_for_tokens(60)  # Should trigger wait
-    elapsed = time.time() - start_time
-    assert elapsed >= 60  # Verify wait occurred
 
 def test_bedrock_metrics_collector():
     collector = BedrockMetricsCollector()
@@ -33,17 +26,104 @@ def test_bedrock_metrics_collector():
     assert summary['average_latency_ms'] == 100
     assert summary['total_input_tokens'] == 50
 
-def test_invoke_bedrock_with_retries():
-    mock_bedrock = Mock()
-    mock_bedrock.invoke_model.side_effect = [
-        ClientError({'Error': {'Code': 'ThrottlingException'}}, 'operation'),
-        {'body': 'success'}
+def _response_metadata(request_id, latency, input_tokens, output_tokens, status=200, retries=0):
+    return {
+        'RequestId': request_id,
+        'HTTPStatusCode': status,
+        'HTTPHeaders': {
+            'x-amzn-bedrock-invocation-latency': str(latency),
+            'x-amzn-bedrock-input-token-count': str(input_tokens),
+            'x-amzn-bedrock-output-token-count': str(output_tokens),
+            'date': f'date-{request_id}'
+        },
+        'RetryAttempts': retries
+    }
+
+def test_save_metrics(tmp_path):
+    collector = BedrockMetricsCollector()
+    collector.add_metric(_response_metadata('a', 100, 50, 75))
+    collector.add_metric(_response_metadata('b', 300, 150, 25, status=500, retries=2))
+    
+    metrics_file = tmp_path / 'metrics.json'
+    collector.save_metrics(str(metrics_file))
+    saved = json.loads(metrics_file.read_bytes())
+    
+    assert saved['detailed_metrics'] == [
+        {'request_id': 'a', 'http_status': 200, 'latency_ms': 100, 'input_tokens': 50,
+         'output_tokens': 75, 'retry_attempts': 0, 'timestamp': 'date-a'},
+        {'request_id': 'b', 'http_status': 500, 'latency_ms': 300, 'input_tokens': 150,
+         'output_tokens': 25, 'retry_attempts': 2, 'timestamp': 'date-b'}
     ]
-    result = invoke_bedrock_with_retries(
-        mock_bedrock, 
-        '123456789012',
-        {'test': 'request'},
-        max_retries=2
-    )
-    assert result == {'body': 'success'}
-    assert mock_bedrock.invoke_model.call_count == 2
+    assert saved['summary'] == {
+        'total_api_calls': 2,
+        'average_latency_ms': 200.0,
+        'total_input_tokens': 200,
+        'total_output_tokens': 100,
+        'average_input_tokens': 100.0,
+        'average_output_tokens': 50.0,
+        'total_retry_attempts': 2,
+        'success_rate': 50.0
+    }
+
+def test_generate_html_report_scales_latency_chart(tmp_path):
+    collector = BedrockMetricsCollector()
+    for request_id, latency in (('a', 100), ('b', 200), ('c', 50)):
+        collector.add_metric(_response_metadata(request_id, latency, 10, 10))
+    
+    report_file = tmp_path / 'report.html'
+    collector.generate_html_report(str(report_file))
+    report = report_file.read_text()
+    
+    # Spread across the 800px width; the 200ms peak reaches the top of the 200px chart
+    assert 'points="0.0,100.0 400.0,0.0 800.0,150.0"' in report
+    assert 'Peak Latency: 200ms' in report
+    assert 'Total API Calls: 3' in report
+    assert 'Average Latency: 116.67ms' in report
+
+def test_generate_html_report_without_metrics(tmp_path):
+    collector = BedrockMetricsCollector()
+    assert collector.get_summary() == "No metrics collected"
+    
+    report_file = tmp_path / 'report.html'
+    collector.generate_html_report(str(report_file))
+    report = report_file.read_text()
+    
+    assert 'Total API Calls: 0' in report
+    assert 'Success Rate: 0.00%' in report
+    assert 'Average Latency: 0.00ms' in report
+    assert 'points=""' in report
+    assert 'Peak Latency: 0ms' in report
+
+def test_get_aws_clients_cached():
+    with patch('boto3.client') as mock_boto:
+        mock_boto.return_value.get_caller_identity.return_value = {'Account': '123456789012'}
+        first = get_aws_clients()
+        second = get_aws_clients()
+    assert first is second
+    assert first[1] == '123456789012'
+    assert mock_boto.return_value.get_caller_identity.call_count == 1
+    # Throttling is retried and paced by botocore's adaptive mode
+    runtime_config = mock_boto.call_args_list[0].kwargs['config']
+    assert runtime_config.retries == {'max_attempts': 8, 'mode': 'adaptive'}
+
+def test_get_aws_clients_concurrent_first_call():
+    barrier = threading.Barrier(4)
+    
+    def get_after_barrier(_):
+        barrier.wait()
+        return get_aws_clients()
+    
+    with patch('boto3.client') as mock_boto:
+        mock_boto.return_value.get_caller_identity.side_effect = lambda: time.sleep(0.05) or {'Account': '123456789012'}
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(get_after_barrier, range(4)))
+    
+    assert all(result is results[0] for result in results)
+    assert mock_boto.return_value.get_caller_identity.call_count == 1
+    assert mock_boto.call_count == 2  # One bedrock-runtime and one STS client
+
+def test_loads_json_without_orjson():
+    payload = b'{"content": [{"text": "ok"}]}'
+    assert loads_json(payload) == {'content': [{'text': 'ok'}]}
+    with patch('src.bedrock_utils.orjson', None):
+        assert loads_json(payload) == {'content': [{'text': 'ok'}]}
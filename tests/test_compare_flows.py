@@ -1,9 +1,10 @@
 import json
+import logging
 from unittest.mock import MagicMock, patch
 
 import pytest
 
-from src.get_flows import compare_contact_flows
+from src.get_flows import COMPARISON_INSTRUCTIONS, ComparisonTruncatedError, compare_contact_flows, compute_flow_diff, flow_changes, flow_outline, parse_comparison, parse_comparisons
 
 
 @pytest.fixture
@@ -25,7 +26,10 @@ def mock_bedrock_response():
     class MockBody:
         def read(self):
             return json.dumps({
-                'content': [{'text': '```html\n<!DOCTYPE html>\n<html><body>test</body></html>\n```'}]
+                'content': [{'text': json.dumps({
+                    'mermaid': 'flowchart TD\n    A1[Start] --> B1[Transfer]:::added',
+                    'summary_items': ['Added Transfer action']
+                })}]
             })
     
     return {
@@ -33,7 +37,7 @@ def mock_bedrock_response():
         'ResponseMetadata': {}
     }
 
-def test_compare_contact_flows_success(mock_flow_files, mock_bedrock_response, tmp_path):
+def test_compare_contact_flows_success(mock_flow_files, mock_bedrock_response, tmp_path, caplog):
     flow1, flow2 = mock_flow_files
     
     # Create temporary test files
@@ -49,7 +53,8 @@ def test_compare_contact_flows_success(mock_flow_files, mock_bedrock_response, t
         mock_boto.return_value = mock_bedrock
         
         # Run comparison
-        result, metadata = compare_contact_flows('test', str(file1), str(file2))
+        with caplog.at_level(logging.INFO):
+            result, metadata = compare_contact_flows('test', str(file1), str(file2))
         
         # Verify results
         assert result is not None
@@ -57,7 +62,51 @@ def test_compare_contact_flows_success(mock_flow_files, mock_bedrock_response, t
         assert len(result) > 0
         assert 'html' in result[0].lower()
         assert 'body' in result[0].lower()
+        assert 'A1[Start] --> B1[Transfer]:::added' in result[0]
+        assert '<li>Added Transfer action</li>' in result[0]
         assert isinstance(metadata, dict)
+        
+        # Only a summary of the model output is logged at INFO
+        assert 'Bedrock call:' in caplog.text
+        assert 'A1[Start]' not in caplog.text
+        
+        # The static instructions lead the prompt, uncached by default; the flows follow
+        content = json.loads(mock_bedrock.invoke_model.call_args.kwargs['body'])['messages'][0]['content']
+        assert content[0]['text'] == COMPARISON_INSTRUCTIONS
+        assert 'cache_control' not in content[0]
+        assert '"Type":"Transfer"' in content[1]['text']
+
+def test_compare_contact_flows_prompt_caching(mock_flow_files, mock_bedrock_response, tmp_path, monkeypatch):
+    flow1, flow2 = mock_flow_files
+    file1 = tmp_path / "flow1.json"
+    file2 = tmp_path / "flow2.json"
+    file1.write_text(flow1)
+    file2.write_text(flow2)
+    monkeypatch.setenv('BEDROCK_PROMPT_CACHING', 'true')
+    
+    mock_bedrock = MagicMock()
+    mock_bedrock.invoke_model.return_value = mock_bedrock_response
+    with patch('src.get_flows.get_aws_clients', return_value=(mock_bedrock, '123456789012')):
+        compare_contact_flows('test', str(file1), str(file2))
+    
+    content = json.loads(mock_bedrock.invoke_model.call_args.kwargs['body'])['messages'][0]['content']
+    assert content[0]['cache_control'] == {'type': 'ephemeral'}
+    assert 'cache_control' not in content[1]
+
+def test_compare_contact_flows_unchanged(mock_flow_files, tmp_path):
+    flow1, _ = mock_flow_files
+    file1 = tmp_path / "flow1.json"
+    file2 = tmp_path / "flow2.json"
+    file1.write_text(flow1)
+    file2.write_text(flow1)
+    
+    with patch('src.get_flows.get_aws_clients') as mock_get_aws_clients:
+        result, metadata = compare_contact_flows(str(tmp_path / 'test'), str(file1), str(file2))
+    
+    mock_get_aws_clients.assert_not_called()
+    assert metadata == {}
+    assert 'No changes detected' in result[0]
+    assert (tmp_path / 'test.html').read_text() == result[0]
 
 def test_compare_contact_flows_file_error():
     # Mock AWS clients
@@ -104,3 +153,78 @@ def test_compare_contact_flows_file_error():
     
     
     
+
+def test_parse_comparison_ignores_surrounding_text():
+    response = 'Here is the comparison:\n```json\n{"mermaid": "flowchart TD", "summary_items": ["x"]}\n```'
+    assert parse_comparison(response) == {'mermaid': 'flowchart TD', 'summary_items': ['x']}
+
+def test_parse_comparison_invalid():
+    with pytest.raises(Exception, match="No comparison content"):
+        parse_comparison('<html>not json</html>')
+
+def test_compute_flow_diff():
+    flow1 = {
+        "Version": "2019-10-30",
+        "StartAction": "a",
+        "Actions": [
+            {"Identifier": "a", "Type": "MessageParticipant", "Parameters": {"Text": "Hello"}, "Transitions": {"NextAction": "b"}},
+            {"Identifier": "b", "Type": "InvokeLambdaFunction", "Parameters": {}},
+            {"Identifier": "c", "Type": "DisconnectParticipant", "Parameters": {}}
+        ]
+    }
+    flow2 = {
+        "Version": "2019-10-30",
+        "StartAction": "a",
+        "Actions": [
+            {"Identifier": "a", "Type": "MessageParticipant", "Parameters": {"Text": "Welcome"}, "Transitions": {"NextAction": "d"}},
+            {"Identifier": "c", "Type": "DisconnectParticipant", "Parameters": {}},
+            {"Identifier": "d", "Type": "TransferToFlow", "Parameters": {}, "Transitions": {"NextAction": "c", "Errors": [{"NextAction": "c"}]}}
+        ]
+    }
+    
+    diff = compute_flow_diff(flow1, flow2)
+    
+    assert diff['added'] == [flow2['Actions'][2]]
+    assert diff['removed'] == [flow1['Actions'][1]]
+    assert diff['changed'] == [
+        {'path': 'a.Parameters.Text', 'old': 'Hello', 'new': 'Welcome'},
+        {'path': 'a.Transitions.NextAction', 'old': 'b', 'new': 'd'}
+    ]
+    assert flow_outline(flow2) == [['a', 'MessageParticipant', ['d']], ['c', 'DisconnectParticipant', []], ['d', 'TransferToFlow', ['c']]]
+
+def test_parse_comparisons_array():
+    response = 'Here you go: [{"mermaid": "flowchart TD", "summary_items": ["a"]}, {"mermaid": "flowchart LR", "summary_items": []}]'
+    comparisons = parse_comparisons(response, 2)
+    assert [c['mermaid'] for c in comparisons] == ['flowchart TD', 'flowchart LR']
+    
+    with pytest.raises(Exception, match="expected 3 comparisons"):
+        parse_comparisons(response, 3)
+
+def test_flow_changes_memoized(mock_flow_files):
+    flow1, flow2 = mock_flow_files
+    flow_changes.cache_clear()
+    
+    with patch('src.get_flows.compute_flow_diff', wraps=compute_flow_diff) as mock_diff:
+        first = flow_changes(flow1, flow2)
+        assert flow_changes(flow1, flow2) is first
+    
+    mock_diff.assert_called_once()
+    assert flow_changes(flow1, flow1) is None
+
+def test_compare_contact_flows_truncated(mock_flow_files, tmp_path):
+    flow1, flow2 = mock_flow_files
+    file1 = tmp_path / "flow1.json"
+    file2 = tmp_path / "flow2.json"
+    file1.write_text(flow1)
+    file2.write_text(flow2)
+    
+    body = MagicMock()
+    body.read.return_value = json.dumps({'content': [{'text': '[{"mermaid": "flowchart TD'}], 'stop_reason': 'max_tokens'})
+    mock_bedrock = MagicMock()
+    mock_bedrock.invoke_model.return_value = {'body': body, 'ResponseMetadata': {'RequestId': 'truncated'}}
+    
+    with patch('src.get_flows.get_aws_clients', return_value=(mock_bedrock, '123456789012')):
+        with pytest.raises(ComparisonTruncatedError) as exc_info:
+            compare_contact_flows(str(tmp_path / 'test'), str(file1), str(file2))
+    
+    assert exc_info.value.resp_metadata == {'RequestId': 'truncated'}
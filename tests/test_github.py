@@ -20,8 +20,8 @@ def mock_github_api():
     return mock_api
 
 def test_get_file_paths(mock_github_api):
-    with patch('src.get_flows.GhApi', return_value=mock_github_api):
-        paths = get_file_paths(
+    with patch('ghapi.all.GhApi', return_value=mock_github_api):
+        paths, parent_sha = get_file_paths(
             token='test-token',
             owner='test-owner',
             repo='test-repo',
@@ -31,22 +31,25 @@ def test_get_file_paths(mock_github_api):
         
         assert len(paths) == 1
         assert paths[0] == 'contact-flows/flow1.json'
+        assert parent_sha == 'parent_sha'
 
 def test_get_file_versions(mock_github_api):
     mock_content = Mock(content='eyJ0ZXN0IjogInZhbHVlIn0=')  # Base64 encoded {"test": "value"}
     mock_github_api.repos.get_content.return_value = mock_content
     
-    with patch('src.get_flows.GhApi', return_value=mock_github_api):
+    with patch('ghapi.all.GhApi', return_value=mock_github_api):
         original, modified = get_file_versions(
             token='test-token',
             owner='test-owner',
             repo='test-repo',
             commit_sha='test-sha',
-            file_path='test-path'
+            file_path='test-path',
+            parent_sha='parent_sha'
         )
         
         assert original == '{"test": "value"}'
         assert modified == '{"test": "value"}'
+        mock_github_api.repos.get_commit.assert_not_called()
 
 def test_get_file_versions_new_file(mock_github_api):
     class NotFoundError(Exception):
@@ -57,18 +60,29 @@ def test_get_file_versions_new_file(mock_github_api):
         Mock(content='eyJ0ZXN0IjogInZhbHVlIn0=')  # Modified file exists
     ]
     
-    with patch('src.get_flows.GhApi', return_value=mock_github_api):
+    with patch('ghapi.all.GhApi', return_value=mock_github_api):
         original, modified = get_file_versions(
             token='test-token',
             owner='test-owner',
             repo='test-repo',
             commit_sha='test-sha',
-            file_path='test-path'
+            file_path='test-path',
+            parent_sha='parent_sha'
         )
         
         assert original == "{}"
         assert modified == '{"test": "value"}'
 
+def test_github_client_reused(mock_github_api):
+    mock_github_api.repos.get_content.return_value = Mock(content='eyJ0ZXN0IjogInZhbHVlIn0=')
+    
+    with patch('ghapi.all.GhApi', return_value=mock_github_api) as mock_ghapi:
+        paths, parent_sha = get_file_paths('test-token', 'test-owner', 'test-repo', 'test-sha', 'contact-flows')
+        for path in paths:
+            get_file_versions('test-token', 'test-owner', 'test-repo', 'test-sha', path, parent_sha)
+        
+        mock_ghapi.assert_called_once_with(token='test-token')
+
 def test_save_versions(tmp_path):
     original_path = tmp_path / "original.json"
     modified_path = tmp_path / "modified.json"
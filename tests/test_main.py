@@ -2,7 +2,7 @@ from unittest.mock import Mock, patch
 
 import pytest
 
-from src.get_flows import main
+from src.get_flows import TRUNCATED_FLOW_MAX_TOKENS, ComparisonTruncatedError, compare_batch, main, output_basenames
 
 
 @pytest.fixture
@@ -20,7 +20,7 @@ def mock_args():
 @patch('src.get_flows.get_file_paths')
 @patch('src.get_flows.get_file_versions')
 @patch('src.get_flows.save_versions')
-@patch('src.get_flows.compare_contact_flows')
+@patch('src.get_flows.compare_contact_flow_batch')
 @patch('argparse.ArgumentParser.parse_args')
 def test_main_success(
     mock_parse_args,
@@ -34,7 +34,7 @@ def test_main_success(
     # Mock AWS clients
     mock_get_aws_clients.return_value = (Mock(), Mock(), "123456789012")
     mock_parse_args.return_value = mock_args
-    mock_get_paths.return_value = ['contact-flows/flow1.json']
+    mock_get_paths.return_value = (['contact-flows/flow1.json'], 'parent-sha')
     mock_get_versions.return_value = ('{"test": "original"}', '{"test": "modified"}')
     mock_metadata = {
         'RequestId': 'test-request-id',
@@ -47,7 +47,7 @@ def test_main_success(
         },
         'RetryAttempts': 0
     }
-    mock_compare_flows.return_value = (['test.html'], mock_metadata)
+    mock_compare_flows.return_value = (['<html></html>'], mock_metadata)
     
     with patch('os.path.exists', return_value=False), \
          patch('os.makedirs') as mock_makedirs:
@@ -57,7 +57,7 @@ def test_main_success(
         mock_get_paths.assert_called_once()
         mock_get_versions.assert_called_once()
         mock_save_versions.assert_called_once()
-        mock_compare_flows.assert_called_once()
+        mock_compare_flows.assert_called_once_with([('flow1', 'flow1_original.json', 'flow1_modified.json')])
 
 @patch('argparse.ArgumentParser.parse_args')
 def test_main_file_retrieval_error(mock_parse_args, mock_args):
@@ -67,3 +67,99 @@ def test_main_file_retrieval_error(mock_parse_args, mock_args):
         with pytest.raises(Exception) as exc_info:
             main()
         assert str(exc_info.value) == "API Error"
+
+
+@patch('src.get_flows.get_file_paths')
+@patch('src.get_flows.get_file_versions')
+@patch('src.get_flows.save_versions')
+@patch('src.get_flows.compare_contact_flow_batch')
+@patch('argparse.ArgumentParser.parse_args')
+def test_main_batches_comparisons(
+    mock_parse_args,
+    mock_compare_batch,
+    mock_save_versions,
+    mock_get_versions,
+    mock_get_paths,
+    mock_args
+):
+    mock_parse_args.return_value = mock_args
+    mock_get_paths.return_value = ([f'contact-flows/flow{i}.json' for i in range(6)], 'parent-sha')
+    mock_get_versions.return_value = ('{"test": "original"}', '{"test": "modified"}')
+    mock_compare_batch.side_effect = lambda batch: (['<html></html>'] * len(batch), {})
+    
+    with patch('os.path.exists', return_value=True), \
+         patch('src.get_flows.Path.write_text') as mock_write_text:
+        main()
+    
+    assert [len(call.args[0]) for call in mock_compare_batch.call_args_list] == [4, 2]
+    index_html = mock_write_text.call_args.args[0]
+    assert all(f'flow{i}.html' in index_html for i in range(6))
+
+
+@patch('src.get_flows.get_file_paths')
+@patch('src.get_flows.get_file_versions')
+@patch('src.get_flows.save_versions')
+@patch('src.get_flows.compare_contact_flow_batch')
+@patch('argparse.ArgumentParser.parse_args')
+def test_main_dotted_filename(
+    mock_parse_args,
+    mock_compare_batch,
+    mock_save_versions,
+    mock_get_versions,
+    mock_get_paths,
+    mock_args
+):
+    mock_parse_args.return_value = mock_args
+    mock_get_paths.return_value = (['contact-flows/foo.bar.json'], 'parent-sha')
+    mock_get_versions.return_value = ('{"test": "original"}', '{"test": "modified"}')
+    mock_compare_batch.return_value = (['<html></html>'], {})
+    
+    with patch('os.path.exists', return_value=True), \
+         patch('src.get_flows.Path.write_text'):
+        main()
+    
+    mock_save_versions.assert_called_once_with(
+        '{"test": "original"}', '{"test": "modified"}', 'foo.bar_original.json', 'foo.bar_modified.json'
+    )
+    mock_compare_batch.assert_called_once_with([('foo.bar', 'foo.bar_original.json', 'foo.bar_modified.json')])
+
+
+@patch('src.get_flows.compare_contact_flow_batch')
+def test_compare_batch_retries_truncated_flow_with_larger_budget(mock_compare_batch):
+    comparisons = [('a', 'a_original.json', 'a_modified.json')]
+    mock_compare_batch.side_effect = [
+        ComparisonTruncatedError("cut off", {'RequestId': 'first'}),
+        (['<html>a</html>'], {'RequestId': 'retry'}),
+    ]
+    metrics_collector = Mock()
+    
+    assert compare_batch(comparisons, metrics_collector) == ['a.html']
+    assert [call.args for call in mock_compare_batch.call_args_list] == [(comparisons,), (comparisons, TRUNCATED_FLOW_MAX_TOKENS)]
+    assert [call.args[0] for call in metrics_collector.add_metric.call_args_list] == [{'RequestId': 'first'}, {'RequestId': 'retry'}]
+    
+    # A flow that doesn't fit the larger budget either still fails
+    mock_compare_batch.side_effect = ComparisonTruncatedError("cut off", {})
+    with pytest.raises(ComparisonTruncatedError):
+        compare_batch(comparisons, metrics_collector)
+
+def test_output_basenames_distinct():
+    assert output_basenames([
+        'flows/sales/main.json',
+        'flows/support/main.json',
+        'flows/foo.bar.json',
+        'flows_sales_main.json'
+    ]) == ['flows_sales_main', 'flows_support_main', 'foo.bar', 'flows_sales_main-2']
+
+@patch('src.get_flows.compare_contact_flow_batch')
+def test_compare_batch_splits_truncated_batch(mock_compare_batch):
+    comparisons = [('a', 'a_original.json', 'a_modified.json'), ('b', 'b_original.json', 'b_modified.json')]
+    mock_compare_batch.side_effect = [
+        ComparisonTruncatedError("cut off", {'RequestId': 'batch'}),
+        (['<html>a</html>'], {'RequestId': 'a'}),
+        (['<html>b</html>'], {}),
+    ]
+    metrics_collector = Mock()
+    
+    assert compare_batch(comparisons, metrics_collector) == ['a.html', 'b.html']
+    assert [call.args[0] for call in mock_compare_batch.call_args_list] == [comparisons, comparisons[:1], comparisons[1:]]
+    assert [call.args[0] for call in metrics_collector.add_metric.call_args_list] == [{'RequestId': 'batch'}, {'RequestId': 'a'}]